@@ -0,0 +1,142 @@
+import hashlib, hmac, os, struct
+from Crypto.Cipher import AES
+from Crypto import Random
+from sss import *
+
+# Authenticated container format (AES-256 GCM)
+# Source: https://en.wikipedia.org/wiki/Galois/Counter_Mode
+# Source: Hoang, V. T., Reyhanitabar, R., Rogaway, P., & Vizár, D. (2015). Online authenticated-encryption and its nonce-reuse misuse-resistance. In CRYPTO (pp. 493-517). Springer. (STREAM construction)
+#
+# Key idea:
+# Cut the plaintext into chunks and encrypt each with AES-256 GCM, so every chunk carries its own 16 byte tag
+# and is verified as soon as it is read, instead of after a full pass over the file
+# A key-check value in the header tells whether a combined key is the right one before any chunk is touched
+#
+# Conventions:
+# File = [header, chunk 0 + tag, chunk 1 + tag, ... ], every chunk holding chunksize bytes except the last (which may be empty)
+# Header = [magic "SSSA", version, chunksize (4 bytes little-endian), nonce prefix (8 random bytes), key-check value (16 bytes)]
+# Nonce of chunk i = nonce prefix + i (4 bytes big-endian), so chunks cannot be reordered
+# Associated data of chunk i = header + last chunk flag, so chunks cannot be moved between files and the file cannot be truncated
+# Key-check value = HMAC-SHA256(key, "SSSA key check") truncated to 16 bytes. Unlike AES_key(0), this does not reveal GCM's hash key
+MAGIC = b'SSSA'
+VERSION = 1
+HEADER = struct.Struct('<4sBI8s16s')
+TAGSIZE = 16
+
+def key_check(key):
+    '''
+    Returns the key-check value of key
+    '''
+    return hmac.new(key, b'SSSA key check', hashlib.sha256).digest()[:16]
+
+def chunk_cipher(key, prefix, i, header, last):
+    '''
+    Returns the AES-256 GCM cipher object of chunk i
+    '''
+    cipher = AES.new(key, AES.MODE_GCM, nonce = prefix + struct.pack('>I', i))
+    cipher.update(header + bytes([last]))
+    return cipher
+
+def is_sealed(infile):
+    '''
+    Returns True if infile is an authenticated container
+    '''
+    with open(infile, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def read_header(f):
+    '''
+    Reads the header of the open container f
+
+    Returns (header bytes, chunksize, nonce prefix, key-check value)
+    '''
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise Exception("File is truncated. Please ensure the file is a valid authenticated container.")
+    magic, version, chunksize, prefix, check = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise Exception("Not an authenticated container.")
+    if version != VERSION:
+        raise Exception("Unsupported authenticated container version {}.".format(version))
+    if chunksize == 0:
+        raise Exception("Chunk size is 0. Please ensure the file is a valid authenticated container.")
+    return header, chunksize, prefix, check
+
+def check_key(key, infile):
+    '''
+    Returns True if key matches the key-check value of the container infile. Only reads the header
+    '''
+    with open(infile, 'rb') as f:
+        check = read_header(f)[3]
+    return hmac.compare_digest(key_check(key), check)
+
+def seal(key, infile, outfile, blocksize = BLOCKSIZE):
+    '''
+    Encrypts infile to the container outfile under key, blocksize bytes per chunk
+
+    1) Write header with a random nonce prefix and the key-check value
+    2) Read in plaintext one chunk ahead, so the last chunk is known when it is encrypted
+    3) Encrypt each chunk and write it followed by its tag
+
+    Throws exception unless 0 < blocksize < 2^32, as the chunk size is stored in 4 bytes
+    '''
+    if blocksize <= 0 or blocksize >= 2 ** 32:
+        raise Exception("Block size must be positive and below 2^32 for authenticated containers, got {}.".format(blocksize))
+
+    header = HEADER.pack(MAGIC, VERSION, blocksize, Random.new().read(8), key_check(key))
+    prefix = header[9:17]
+
+    with open(infile, 'rb') as fin, open(outfile, 'wb') as fout:
+        fout.write(header)
+        i, chunk = 0, fin.read(blocksize)
+        while True:
+            following = fin.read(blocksize)
+            ciphertext, tag = chunk_cipher(key, prefix, i, header, not following).encrypt_and_digest(chunk)
+            fout.write(ciphertext + tag)
+            if not following:
+                break
+            i, chunk = i + 1, following
+
+def unseal_chunks(key, fin):
+    '''
+    Generator over the verified plaintext chunks of the open container fin under key, reading one chunk per step
+    Throws exception before reading any chunk if key does not match the key-check value,
+    and when a chunk fails verification or the file is truncated
+    '''
+    header, chunksize, prefix, check = read_header(fin)
+    if not hmac.compare_digest(key_check(key), check):
+        raise Exception("Keys provided do not match the file. Please ensure enough valid keys are provided.")
+
+    i, chunk = 0, fin.read(chunksize + TAGSIZE)
+    while True:
+        if len(chunk) < TAGSIZE:
+            raise Exception("File is truncated. Please ensure the file is a valid authenticated container.")
+        following = fin.read(chunksize + TAGSIZE)
+        cipher = chunk_cipher(key, prefix, i, header, not following)
+        try:
+            plaintext = cipher.decrypt_and_verify(chunk[:-TAGSIZE], chunk[-TAGSIZE:])
+        except ValueError:
+            raise Exception("Chunk {} failed verification. Please ensure the file has not been modified.".format(i))
+        yield plaintext
+        if not following:
+            break
+        i, chunk = i + 1, following
+
+def unseal(key, infile, outfile):
+    '''
+    Decrypts the container infile to outfile under key, verifying every chunk before it is written
+    Throws exception before creating outfile if key does not match the key-check value
+    Throws exception and removes outfile if any chunk fails verification or the file is truncated
+    '''
+    if not check_key(key, infile):
+        raise Exception("Keys provided do not match the file. Please ensure enough valid keys are provided.")
+
+    with open(infile, 'rb') as fin:
+        try:
+            with open(outfile, 'wb') as fout:
+                for chunk in unseal_chunks(key, fin):
+                    fout.write(chunk)
+        except BaseException:
+            # Do not leave unverified plaintext behind
+            os.remove(outfile)
+            raise
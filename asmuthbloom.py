@@ -1,6 +1,7 @@
-import sys, math
+import sys, threading
 from sss import *
-from Crypto.Random import random # A cryptographically strong version of Python's standard "random" module
+from operator import itemgetter
+from ntheory import is_probable_prime, crt_tree, crt, crt_columns, product_tree, remainders_columns
 
 class AsmuthBloomSSS(SSS):
     '''
@@ -11,7 +12,7 @@ class AsmuthBloomSSS(SSS):
     Pick n pairwise coprime integers m1, .. , mn
     Pick m0 such that gcd(m0, mi) = 1 for i = 1, ... , n
     Required condition: Product of smallest k primes > m0 * Product of largest (k-1) primes
-    
+
     Let secret S = x
     Let M = Product of smallest k primes
     Pick random A such that 0 <= x + A * m0 <= M
@@ -22,96 +23,289 @@ class AsmuthBloomSSS(SSS):
 
     Conventions:
     Solution to Chinese Remainder Theorem is the secret/key S
-    We split the 256 bit AES key into 32 chunks of 8-bit/1-byte, then encode each of them
-    This is because it is really hard to find a set of pairwise coprime integers that satisfy the required conditions.
-
-    For now,
-    1) Maximum allowable n is 10. i.e. At most split into 10 shares
-    2) Choice of mi's are smallest n primes out of the list of 91st to 100th primes.
-    3) m0 is fixed at 2^8 = 256
+    m0 = p > 2^256, so the whole 256 bit AES key is encoded with a single CRT
+    mi's are the smallest n primes above 2^386. As they are all within a tiny fraction of each other,
+    the product of any k of them exceeds m0 times the product of any other (k-1) of them by a factor of about 2^386 / m0 = 2^129, for any n and k
+    The correctness condition is checked with a margin of 2^margin_bits = 2^128 on top
+    This margin is what keeps k-1 keys from telling anything about S: y is uniform over a range 2^128 times as long as
+    the product of their mi's, so y mod that product is close to uniform whatever S is
+    CRT constants only depend on the set of mi's, so they are cached for repeated reconstructions by the same quorum
     '''
 
-    def __init__(self):
+    name = 'AsmuthBloom'
+
+    # Primes above 2^moduli_bits, in increasing order. Shared by all instances and extended on demand
+    # Never modified in place: get_moduli extends a copy and publishes it under moduli_lock, so concurrent callers always see a consistent list
+    moduli_bits = 386
+    margin_bits = 128
+    moduli = []
+    moduli_lock = threading.Lock()
+
+    # Keys split by earlier versions used the 91st to 100th primes with m0 = 256, one CRT per byte of the AES key
+    legacy_m0 = 256
+
+    def __init__(self, cache_size = 128):
         '''
-        The 91st to 100th primes are used as a set of pairwise coprime integers.
-        Fix m0 = 2^8 = 256.
+        Fix m0 = p.
+        cache_size bounds the number of mi sets whose CRT constants are kept
         '''
 
         super().__init__()
-        self.primes = [467, 479, 487, 491, 499, 503, 509, 521, 523, 541]
-        self.m0 = 256
+        self.m0 = self.p
+        self.crt_cache = LRUCache(cache_size)
 
-    def split_key(self, key, n, k):
+    def get_moduli(self, n):
         '''
-        Split AES key into 32 chunks then encode each chunk using smallest n primes
-        Let y = x + A * m0
+        Returns the smallest n primes above 2^moduli_bits
+        '''
+        m = AsmuthBloomSSS.moduli
+        if len(m) >= n:
+            return m[:n]
+
+        with AsmuthBloomSSS.moduli_lock:
+            # Another thread may have published more primes while this one waited for the lock
+            m = AsmuthBloomSSS.moduli
+            if len(m) < n:
+                m = self.find_moduli(list(m), n)
+                AsmuthBloomSSS.moduli = m
+        return m[:n]
 
-        Key i = [mi, y for chunk 1, ... , y for chunk 32]
+    def find_moduli(self, m, n):
         '''
+        Appends the next primes above the last one in m (or above 2^moduli_bits if m is empty) to m until it holds n primes
 
-        assert (n <= 10), "For now, AsmuthBloomSSS only works with n <= 10."
+        Returns m
 
-        # Split into 256 bit AES key into 32 chunks of 8-bit/1-byte
-        chunks = [c for c in key]
-        
-        # Grab the smallest n primes as mi's
-        m = self.primes[:n]
+        Implementation notes:
+        Sieve a window of odd candidates start, start + 2, ... with small primes first,
+        so that the expensive Miller-Rabin test only runs on candidates without small factors
+        '''
+        start = m[-1] + 2 if m else 2**self.moduli_bits + 1
+        small = [q for q in range(3, 2000, 2) if all(q % d for d in range(3, int(q ** 0.5) + 1, 2))]
+        window = 4096
+        while len(m) < n:
+            composite = bytearray(window)
+            for q in small:
+                # Index i holds start + 2i, so the first multiple of q is at i = (-start) * 2^-1 mod q
+                first = (-start) * mulinv(2, q) % q
+                composite[first::q] = b'\x01' * len(range(first, window, q))
+            for i in range(window):
+                if not composite[i] and is_probable_prime(start + 2 * i):
+                    m.append(start + 2 * i)
+                    if len(m) == n:
+                        break
+            start += 2 * window
+        return m
 
-        # Compute M as the product of smallest k mi's
-        M = prod(m[:k])
+    def split_key(self, key, n, k):
+        '''
+        Encode AES key using smallest n primes above 2^moduli_bits
+        Let y = x + A * m0
 
-        # Check correctness condition
-        assert (self.m0 * prod(m[-k+1:]) < prod(m[:k]))
+        Key i = [mi, y mod mi]
+        '''
+        return self.split_keys([key], n, k)[0]
 
-        keys = [[mi] for mi in m]
-        for c in chunks:
-            # Generate random A such that 0 <= c + A * m0 < M
-            A = random.randrange(0, math.floor((M - c) / self.m0))
-            y = c + A * self.m0
-            assert(y < M)
+    def split_keys(self, keys, n, k):
+        '''
+        Splits many AES keys with one call
+        Moduli, M and the correctness condition are set up once per (n, k) by the dealer, and random A's for all keys are drawn with a single read
 
-            # Generate shares for each 8-bit chunk
-            shares = [y % mi for mi in m]
-            for i in range(n):
-                keys[i].append(shares[i])
+        Returns a list holding the output of split_key for each key
+        '''
+        return self.dealer(n, k).split(keys)
 
-        # Return keys
-        return keys
+    def make_dealer(self, n, k):
+        '''
+        Builds the dealer of (n, k), see AsmuthBloomDealer
+        '''
+        return AsmuthBloomDealer(self, n, k)
 
     def combine_keys(self, keys):
         '''
-        Extract mi's and y chunks, then apply Chinese Remainder Theorem (CRT) to each chunk individually
-        Combine all 32 chunks back into a single 256 bit AES key
-        
-        Key = Merged CRT solutions to all 32 chunks
+        Extract mi's and y mod mi's, then apply Chinese Remainder Theorem (CRT)
+
+        Key = CRT solution mod m0
         '''
 
+        # Keys split by earlier versions hold 32 chunks
+        if len(keys[0]) == 33:
+            return self.combine_legacy_keys(keys)
+
         # keys[i][0] = mi
-        # keys[i][1..32] = y mod mi (32 different y chunks)
-        k = len(keys)
+        # keys[i][1] = y mod mi
+        # Sort by mi so that every ordering of the same quorum shares a cache entry
+        keys = sorted(keys, key = lambda key: key[0])
+        m = tuple(key[0] for key in keys)
+        r = [key[1] for key in keys]
 
-        # m = [m1, m2, ... , mk]
-        # chunks = [[y1, y2, ... , yk], ... , [y1, y2, ... , yk]]
-        # Each [y1, y2, ... , yk] represent a 8-bit chunk of the original 256-bit AES key
-        m = [keys[i][0] for i in range(k)]
-        chunks = [[keys[i][j] for i in range(k)] for j in range(1,33)]
-
-        # Compute M, mi
-        # M = product of all mi
-        # zi = M / mi
-        # bi * (M / mi) = 1 (mod mi), i.e. bi = mulinv(zi, mi)
-        # S = (y1 * z1 * b1 + y2 * z2 * b2 + ... + yk * zk * bk) % M % m0
+        # Solve y = r[i] (mod m[i]) for all i with a cached product tree of the mi's
+        # Secret S = AES key = y mod m0
         #
         # Implementation notes:
-        # z = [int(M / mi) for mi in m]: Fails because of division precision error
-        M = prod([mi for mi in m])
-        z = [prod([m[i] for i in range(k) if i != j]) for j in range(k)]
-        b = [mulinv(z[i], m[i]) for i in range(k)]
-        S_chunks = [int(sum(y[i] * z[i] * b[i] % M for i in range(k)) % M % self.m0) for y in chunks]
-        
-        # Secret S = AES key = Merged Chinese Remainder Theorem solutions of all 32 chunks
-        S = sum(S_chunks[i] * (256 ** i) for i in range(32))
+        # Take modulo (2 ** 256) because insufficent/invalid keys may result in S > 256 bits
+        # If S > 256 bits, then it will crash in the conversion to 32 byte representation
+        tree = self.crt_cache.lookup(m, lambda: crt_tree(m))
+        S = crt(tree, r) % self.m0 % (2 ** 256)
         key = S.to_bytes(32, byteorder = sys.byteorder)
 
         # Return key
-        return key
\ No newline at end of file
+        return key
+
+    def combine_keys_batch(self, shares_by_secret):
+        '''
+        Combines many sets of shares with one call
+        Sets of shares from the same quorum (same mi's) share one cached product tree, and CRT runs column by column
+        over the remainders of all their secrets (see crt_columns)
+
+        Returns a list holding the output of combine_keys for each set of shares
+        '''
+        result = [None] * len(shares_by_secret)
+        groups = {}
+        for i, keys in enumerate(shares_by_secret):
+            # Keys split by earlier versions hold 32 chunks
+            if len(keys[0]) == 33:
+                result[i] = self.combine_legacy_keys(keys)
+            else:
+                groups.setdefault(tuple(map(itemgetter(0), keys)), []).append(i)
+
+        for m, indices in groups.items():
+            # Sort by mi so that every ordering of the same quorum shares a cache entry
+            order = sorted(range(len(m)), key = m.__getitem__)
+            ms = tuple(m[j] for j in order)
+            tree = self.crt_cache.lookup(ms, lambda: crt_tree(ms))
+
+            # r[j] holds y mod mj of every secret in the group
+            r = [[shares_by_secret[i][j][1] for i in indices] for j in order]
+            for i, y in zip(indices, crt_columns(tree, r)):
+                result[i] = (y % self.m0 % (2 ** 256)).to_bytes(32, byteorder = sys.byteorder)
+        return result
+
+    def add_keys(self, keys, k, ids):
+        '''
+        Recovers y from the given keys via CRT, then reduces it modulo the mi's of ids
+        Only possible while the correctness condition holds for all mi's up to the largest id
+
+        Key i = [mi, y mod mi]
+        '''
+        if any(i < 1 for i in ids):
+            raise Exception("Key ids must be at least 1. Please ensure all key ids are valid.")
+        m = self.get_moduli(max(ids))
+        y = self.recover(keys, k, m)
+        return [[m[i-1], y % m[i-1]] for i in ids]
+
+    def refresh_keys(self, keys, k):
+        '''
+        Recovers y = x + A * m0 from the given keys via CRT, then draws a fresh random A as in split_keys,
+        with M = product of the smallest k mi's of the given keys
+
+        Key i = [mi, y' mod mi], y' = x + A' * m0
+        '''
+        m = sorted(key[0] for key in keys)
+        x = self.recover(keys, k, m) % self.m0
+        M = prod(m[:k])
+        A = random_ints(1, M.bit_length() // 8 + 8)[0] % ((M - x) // self.m0)
+        y = x + A * self.m0
+        return [[key[0], y % key[0]] for key in keys]
+
+    def recover(self, keys, k, m):
+        '''
+        Returns y from >= k keys via CRT, checking that y < M = product of the smallest k mi's
+        m are the mi's (in increasing order) that keys will be produced for. Throws exception if the correctness condition does not hold for them
+        '''
+        if len(keys[0]) != 2:
+            raise Exception("Keys split by earlier versions cannot be added or refreshed. Please decrypt and encrypt the file again.")
+        if len(keys) < k:
+            raise Exception("Insufficient keys provided. Please ensure at least {} valid keys are provided.".format(k))
+
+        # y was only drawn against a large enough M if the keys use our mi's, i.e. primes above 2^moduli_bits.
+        # Keys mod other (e.g. smaller) mi's would give away y, and so S, once y is reduced modulo fewer of ours
+        if any(not self.is_modulus(key[0]) for key in keys):
+            raise Exception("Keys with unsupported moduli were provided. Please ensure all keys were split by this version.")
+
+        M = prod(m[:k])
+        if self.m0 * prod([1] + m[len(m)-k+1:]) << self.margin_bits >= M:
+            raise Exception("AsmuthBloomSSS cannot support {} keys with threshold {}.".format(len(m), k))
+
+        keys = sorted(keys, key = lambda key: key[0])
+        mk = tuple(key[0] for key in keys)
+        y = crt(self.crt_cache.lookup(mk, lambda: crt_tree(mk)), [key[1] for key in keys])
+        if y >= M:
+            raise Exception("Keys provided are inconsistent. Please ensure all keys are valid.")
+        return y
+
+    def is_modulus(self, mi):
+        '''
+        Returns True if mi is one of the mi's returned by get_moduli for some n, i.e. a prime above 2^moduli_bits
+        As get_moduli returns the smallest primes above 2^moduli_bits, every such prime is among them, so no list is built
+        '''
+        return mi > 2**self.moduli_bits and is_probable_prime(mi)
+
+    def combine_legacy_keys(self, keys):
+        '''
+        Combines keys split by earlier versions, which encode each of the 32 bytes of the AES key separately with m0 = 256
+
+        Key = Merged CRT solutions to all 32 chunks
+        '''
+        k = len(keys)
+        m = tuple(keys[i][0] for i in range(k))
+        tree = self.crt_cache.lookup(m, lambda: crt_tree(m))
+        S_chunks = [crt(tree, [keys[i][j] for i in range(k)]) % self.legacy_m0 for j in range(1, 33)]
+        return bytes(S_chunks)
+
+    def cache_info(self):
+        '''
+        Returns hit/miss statistics of the CRT constant cache
+        '''
+        return self.crt_cache.info()
+
+class AsmuthBloomDealer(Dealer):
+    '''
+    Splits keys for one (n, k) of AsmuthBloomSSS, sharing the mi's, M, the correctness check and a product tree of the mi's across splits
+
+    Implementation notes:
+    y has about k times as many bits as each mi, so reducing it by every mi separately dominates a split for large n, k
+    The product tree reduces y modulo products of ever fewer mi's on the way down instead, for all keys of a split together (see remainders_columns)
+    '''
+
+    def __init__(self, sss, n, k):
+        super().__init__(sss, n, k)
+        assert (1 <= k <= n), "AsmuthBloomSSS needs 1 <= k <= n."
+
+        # Grab the smallest n primes as mi's
+        self.m = sss.get_moduli(n)
+        assert all(a < b for a, b in zip(self.m, self.m[1:])), "AsmuthBloomSSS needs distinct moduli in increasing order."
+
+        # Compute M as the product of smallest k mi's
+        self.M = prod(self.m[:k])
+
+        # Check correctness condition, with a security margin
+        assert (sss.m0 * prod([1] + self.m[n-k+1:]) << sss.margin_bits < self.M)
+
+        self.tree = product_tree(self.m)
+        self.nbytes = table_nbytes(self.tree) + table_nbytes(self.M)
+
+    def split(self, keys):
+        '''
+        Splits many AES keys, like AsmuthBloomSSS.split_keys
+        Let y = x + A * m0
+
+        Key i = [mi, y mod mi]
+        '''
+        m0, M = self.sss.m0, self.M
+
+        # Implementation notes:
+        # Random A is drawn with 64 more bits than M and reduced modulo its range, so the bias is below 2^-64
+        r = random_ints(len(keys), M.bit_length() // 8 + 8)
+
+        ys = []
+        for key, ri in zip(keys, r):
+            # Generate random A such that 0 <= x + A * m0 < M
+            x = int.from_bytes(key, byteorder = sys.byteorder)
+            A = ri % ((M - x) // m0)
+            y = x + A * m0
+            assert(y < M)
+            ys.append(y)
+
+        # Reduce all y's down the product tree together, one list per mi
+        return [[[mi, yi] for mi, yi in zip(self.m, row)] for row in zip(*remainders_columns(self.tree, ys))]
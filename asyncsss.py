@@ -0,0 +1,124 @@
+import asyncio, os
+from Crypto import Random
+from sss import *
+from aead import check_key, is_sealed, unseal_chunks
+
+class AsyncSSS:
+    '''
+    asyncio counterpart of the SSS encrypt/decrypt API, for embedding in async services
+    Wraps an SSS scheme instance, e.g. AsyncSSS(ShamirSSS())
+
+    Conventions:
+    File I/O and AES run block by block in executor threads, so the event loop is never blocked for more than one hop
+    Key splitting/combining also runs in the executor, as it is CPU-bound bignum work
+    At most max_concurrency operations run at once. Further calls wait for a free slot
+    Cancelling an operation stops it at the next block boundary and removes its partially written outfile
+    Unlike SSS.decrypt_with_keys, failing to combine keys raises instead of writing the error message to outfile
+    '''
+
+    def __init__(self, sss, max_concurrency = 4, executor = None, blocksize = BLOCKSIZE):
+        '''
+        executor defaults to the event loop's default executor
+        '''
+        self.sss = sss
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.executor = executor
+        self.blocksize = blocksize
+
+    async def run(self, function, *args):
+        '''
+        Runs function(*args) in the executor
+        '''
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def encrypt(self, infile, outfile, keysfile, n, k, binary = False):
+        '''
+        Encrypts infile to outfile via AES-256 and stores "broken up" key in keysfile, like SSS.encrypt
+        '''
+        async with self.semaphore:
+            # Create AES-256 key with 32 random bytes
+            key = Random.new().read(32)
+
+            # Read, encrypt and write infile to outfile block by block
+            await self.crypt(self.ctr_blocks(ctr_cipher(key).encrypt), infile, outfile)
+
+            # Generate and store n keys
+            keys = await self.run(self.sss.split_key, key, n, k)
+            await self.run(self.sss.store_keys, keysfile, keys, n, k, binary)
+
+    async def decrypt(self, infile, outfile, keysfile):
+        '''
+        Reads in keys/shares from keysfile and decrypts infile to outfile with them, like SSS.decrypt
+        '''
+        keys = await self.run(self.sss.load_keys, keysfile)
+        await self.decrypt_with_keys(infile, outfile, keys)
+
+    async def decrypt_with_keys(self, infile, outfile, keys):
+        '''
+        Decrypts infile to outfile via AES-256 with keys, like SSS.decrypt_with_keys
+        '''
+        async with self.semaphore:
+            # Combine given keys. May throw exception if < k valid keys are given
+            key = await self.run(self.sss.combine_keys, keys)
+
+            # Authenticated containers (see aead.py): Check the key before outfile is created, then verify and write chunk by chunk
+            if await self.run(is_sealed, infile):
+                if not await self.run(check_key, key, infile):
+                    raise Exception("Keys provided do not match the file. Please ensure enough valid keys are provided.")
+                await self.crypt(lambda fin: unseal_chunks(key, fin), infile, outfile)
+                return
+
+            # Read, decrypt and write infile to outfile block by block
+            await self.crypt(self.ctr_blocks(ctr_cipher(key).decrypt), infile, outfile)
+
+    def ctr_blocks(self, crypt):
+        '''
+        Returns blocks for crypt: a function mapping the open infile to a generator over its blocks of blocksize bytes, passed through crypt
+        '''
+        def blocks(fin):
+            for block in iter(lambda: fin.read(self.blocksize), b''):
+                yield crypt(block)
+        return blocks
+
+    async def crypt(self, blocks, infile, outfile):
+        '''
+        Streams the output blocks of infile, generated by blocks(open infile), into outfile, one executor hop per block
+        Every hop reads, encrypts/decrypts (and verifies) and writes a single block
+        '''
+        fin = await self.run(open, infile, 'rb')
+        try:
+            fout = await self.run(open, outfile, 'wb')
+        except BaseException:
+            await self.run(fin.close)
+            raise
+
+        # Generators do not run until their first step, so nothing is read here
+        generator = blocks(fin)
+
+        def step():
+            # Read, encrypt/decrypt and write one block. Returns False at the end of infile
+            block = next(generator, None)
+            if block is not None:
+                fout.write(block)
+            return block is not None
+
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                future = loop.run_in_executor(self.executor, step)
+                try:
+                    more = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # Let the block in flight finish before its files are closed
+                    await asyncio.wait([future])
+                    raise
+                if not more:
+                    break
+        except BaseException:
+            # Cancelled or failed: Do not leave a partial outfile behind
+            await self.run(fout.close)
+            await self.run(os.remove, outfile)
+            raise
+        finally:
+            await self.run(fin.close)
+            await self.run(fout.close)
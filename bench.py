@@ -0,0 +1,236 @@
+import argparse, json, os, platform, resource, statistics, sys, tempfile, time
+import multiprocessing as mp
+from blakley import *
+from shamir import *
+from asmuthbloom import *
+from gf256 import *
+
+####################
+# Argument Parsing #
+####################
+'''
+Sample execution:
+
+>>> python3 bench.py -keys -json results.json
+
+Times split_key and combine_keys of every scheme over a grid of (n, k), and stores the results as JSON
+
+>>> python3 bench.py -files -sizes 1K,1M,1G -json results.json -baseline baseline.json
+
+Times encrypt and decrypt_with_keys over locally generated payloads of 1 KB, 1 MB and 1 GB,
+then flags every result that got more than 10% slower than in baseline.json (exit status 1 if any)
+
+>>> python3 bench.py -io -size 4096 -workers 4
+
+Encrypts a locally generated 4096 MB file with every I/O backend, each in a fresh process,
+and reports wall time, throughput and peak RSS of that process
+
+Without -keys, -files or -io, all three are run
+
+Conventions:
+Every result is {"name": ..., "seconds": median time per call, "min": fastest time per call, "calls": calls timed, ...}
+so that results of different runs are matched by name and compared by median time (lower is better)
+'''
+
+SCHEMES = [['Shamir', ShamirSSS], ['Blakley', BlakleySSS], ['AsmuthBloom', AsmuthBloomSSS], ['GF256', GF256SSS]]
+GRID = [3, 5, 10, 20, 50]
+UNITS = {'K': 2**10, 'M': 2**20, 'G': 2**30}
+
+def measure(function, repeat = 5, budget = 0.2):
+    '''
+    Times function() repeat times, calling it as often as fits into budget seconds per repetition (at least once)
+
+    Returns (median seconds per call, fastest seconds per call, number of calls timed)
+    '''
+    # Calibrate number of calls per repetition with a single call
+    start = time.perf_counter()
+    function()
+    number = max(int(budget / max(time.perf_counter() - start, 1e-9)), 1)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return statistics.median(times), min(times), repeat * number
+
+def parse_size(size):
+    '''
+    Returns the number of bytes in a size such as 512, 64K, 16M or 2G
+    '''
+    size = size.strip().upper()
+    if size[-1] in UNITS:
+        return int(size[:-1]) * UNITS[size[-1]]
+    return int(size)
+
+def generate(path, size):
+    '''
+    Writes size random bytes to path, 1 MB at a time
+    '''
+    with open(path, 'wb') as f:
+        for offset in range(0, size, 2 ** 20):
+            f.write(os.urandom(min(2 ** 20, size - offset)))
+
+def bench_keys(results, repeat, budget):
+    '''
+    Times split_key and combine_keys of every scheme for every (n, k) of the grid, k in {2, n/2, n}
+    combine_keys is timed warm (same quorum every call, so cached constants are reused) and cold (a fresh instance every call)
+    '''
+    key = Random.new().read(32)
+    for scheme_name, scheme in SCHEMES:
+        for n in GRID:
+            for k in sorted({2, n // 2, n}):
+                if k < 2:
+                    continue
+                sss = scheme()
+                keys = sss.split_key(key, n, k)
+                quorum = keys[-k:]
+                for name, function in [['split_key', lambda: sss.split_key(key, n, k)],
+                                       ['combine_keys', lambda: sss.combine_keys(quorum)],
+                                       ['combine_keys_cold', lambda: scheme().combine_keys(quorum)]]:
+                    median, fastest, calls = measure(function, repeat, budget)
+                    report(results, {'name': "{}/{}/n={}/k={}".format(name, scheme_name, n, k), 'seconds': median, 'min': fastest, 'calls': calls, 'ops': 1 / median})
+
+def bench_files(results, sizes, scheme_name, directory, blocksize, workers, backend, repeat):
+    '''
+    Times encrypt and decrypt_with_keys of a 3-of-5 split over locally generated payloads of every size
+    Decryption uses the keys of the last encrypt repetition, and its output is checked against the payload once
+    '''
+    sss = dict(SCHEMES)[scheme_name]()
+    with tempfile.TemporaryDirectory(dir = directory) as tmp:
+        infile, cipherfile, keysfile, outfile = [os.path.join(tmp, name) for name in ["plain.bin", "cipher.bin", "keys.txt", "restored.bin"]]
+        for size in sizes:
+            generate(infile, size)
+            for name in ['encrypt', 'decrypt_with_keys']:
+                # Every encrypt repetition writes a new key, so keys are loaded after the last one
+                if name == 'decrypt_with_keys':
+                    keys = sss.load_keys(keysfile)[:3]
+                times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    if name == 'encrypt':
+                        sss.encrypt(infile, cipherfile, keysfile, 5, 3, blocksize, workers, backend)
+                    else:
+                        sss.decrypt_with_keys(cipherfile, outfile, keys, blocksize, workers, backend)
+                    times.append(time.perf_counter() - start)
+                median = statistics.median(times)
+                report(results, {'name': "{}/{}/{}/size={}".format(name, scheme_name, backend, size), 'seconds': median, 'min': min(times), 'calls': repeat, 'bytes': size, 'MBps': size / 2**20 / max(median, 1e-9)})
+            if not same_contents(infile, outfile):
+                raise Exception("Decrypted payload of size {} does not match the original. Please ensure {} round-trips.".format(size, scheme_name))
+            os.remove(outfile)
+
+def same_contents(a, b):
+    '''
+    Returns True if files a and b hold the same bytes, comparing 1 MB at a time
+    '''
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        while True:
+            block = fa.read(2 ** 20)
+            if block != fb.read(2 ** 20):
+                return False
+            if not block:
+                return True
+
+def run_backend(queue, key, infile, outfile, blocksize, workers, backend):
+    '''
+    Encrypts infile to outfile with the given backend, then reports (wall time, peak RSS in MB) through queue
+    Runs in a freshly spawned process so that peak RSS only accounts for this backend
+    '''
+    start = time.perf_counter()
+    crypt_file(key, infile, outfile, blocksize, workers, backend)
+    seconds = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    queue.put((seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+def bench_io(results, size, directory, blocksize, workers):
+    '''
+    Encrypts a generated file of size MB with every I/O backend, each in a freshly spawned process
+    '''
+    with tempfile.TemporaryDirectory(dir = directory) as tmp:
+        infile = os.path.join(tmp, "plain.bin")
+        outfile = os.path.join(tmp, "cipher.bin")
+        generate(infile, size * 2**20)
+
+        key = Random.new().read(32)
+        ctx = mp.get_context('spawn')
+        for backend in BACKENDS:
+            queue = ctx.Queue()
+            p = ctx.Process(target = run_backend, args = (queue, key, infile, outfile, blocksize, workers, backend))
+            p.start()
+            seconds, rss = queue.get()
+            p.join()
+            report(results, {'name': "crypt_file/{}/workers={}/size={}".format(backend, workers, size * 2**20), 'seconds': seconds, 'min': seconds, 'calls': 1,
+                             'bytes': size * 2**20, 'MBps': size / seconds, 'peak_rss_MB': rss})
+
+def report(results, result):
+    '''
+    Appends result to results and prints it
+    '''
+    results.append(result)
+    extra = ", {:.1f} MB/s".format(result['MBps']) if 'MBps' in result else ", {:.0f} ops/s".format(result['ops']) if 'ops' in result else ""
+    if 'peak_rss_MB' in result:
+        extra += ", peak RSS {:.1f} MB".format(result['peak_rss_MB'])
+    print("{:<48} {:>12.6f} s{}".format(result['name'], result['seconds'], extra))
+
+def compare(results, baseline, threshold):
+    '''
+    Matches results with baseline results by name, and prints every result whose median time grew by more than threshold
+
+    Returns the list of regressed result names
+    '''
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        if result['name'] not in previous:
+            continue
+        ratio = result['seconds'] / max(previous[result['name']]['seconds'], 1e-12)
+        if ratio > 1 + threshold:
+            regressions.append(result['name'])
+            print("REGRESSION {:<48} {:.6f} s -> {:.6f} s ({:+.1f}%)".format(result['name'], previous[result['name']]['seconds'], result['seconds'], 100 * (ratio - 1)))
+        elif ratio < 1 - threshold:
+            print("IMPROVED   {:<48} {:.6f} s -> {:.6f} s ({:+.1f}%)".format(result['name'], previous[result['name']]['seconds'], result['seconds'], 100 * (ratio - 1)))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-keys", help = "Time split_key/combine_keys of every scheme over a grid of (n, k)", action = "store_true")
+    parser.add_argument("-files", help = "Time encrypt/decrypt_with_keys over payloads of -sizes", action = "store_true")
+    parser.add_argument("-io", help = "Compare the I/O backends on a file of -size MB, reporting peak RSS", action = "store_true")
+    parser.add_argument("-sizes", help = "Comma separated payload sizes for -files, with optional K/M/G suffix (default: 1K,64K,1M,16M,256M)", default = "1K,64K,1M,16M,256M")
+    parser.add_argument("-scheme", help = "Scheme whose keys are split by -files (default: Shamir)", choices = [s for s, _ in SCHEMES], default = 'Shamir')
+    parser.add_argument("-size", help = "Size of generated plaintext in MB for -io (default: 256)", type = int, default = 256)
+    parser.add_argument("-blocksize", help = "Number of bytes encrypted at a time (default: {})".format(BLOCKSIZE), type = int, default = BLOCKSIZE)
+    parser.add_argument("-workers", help = "Number of threads used to encrypt blocks in parallel (default: 1)", type = int, default = 1)
+    parser.add_argument("-backend", help = "I/O backend used by -files (default: stream)", choices = BACKENDS, default = 'stream')
+    parser.add_argument("-repeat", help = "Number of timed repetitions per result (default: 5)", type = int, default = 5)
+    parser.add_argument("-budget", help = "Seconds spent per repetition of -keys results (default: 0.2)", type = float, default = 0.2)
+    parser.add_argument("-dir", help = "Directory to generate the benchmark files in (default: system temp directory)")
+    parser.add_argument("-json", help = "Name of file to store the results in as JSON")
+    parser.add_argument("-baseline", help = "Name of JSON results file of an earlier run to compare against")
+    parser.add_argument("-threshold", help = "Relative slowdown flagged as regression by -baseline (default: 0.1)", type = float, default = 0.1)
+    args = parser.parse_args()
+
+    if not (args.keys or args.files or args.io):
+        args.keys = args.files = args.io = True
+
+    results = []
+    if args.keys:
+        bench_keys(results, args.repeat, args.budget)
+    if args.files:
+        bench_files(results, [parse_size(size) for size in args.sizes.split(',')], args.scheme, args.dir, args.blocksize, args.workers, args.backend, args.repeat)
+    if args.io:
+        bench_io(results, args.size, args.dir, args.blocksize, args.workers)
+
+    if args.json:
+        meta = {'python': sys.version.split()[0], 'platform': platform.platform(), 'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent = 1)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        print("{} regression(s) against {}".format(len(regressions), args.baseline))
+        if regressions:
+            sys.exit(1)
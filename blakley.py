@@ -1,7 +1,7 @@
-import sys, scipy.linalg
-import numpy as np
+import sys
+from itertools import repeat
+from operator import mod
 from sss import *
-from Crypto.Random import random # A cryptographically strong version of Python's standard "random" module
 
 class BlakleySSS(SSS):
     '''
@@ -19,82 +19,198 @@ class BlakleySSS(SSS):
     Conventions:
     First coordinate is the secret/key S
     Pascal Matrix is used as per suggestion in the second cited paper
+    All arithmetic is exact and done modulo the prime p, so reconstruction is Gaussian elimination over GF(p)
+    The elimination only depends on the set of rows, so its result is cached for repeated reconstructions by the same quorum
     '''
 
-    def __init__(self):
+    name = 'Blakley'
+
+    def __init__(self, cache_size = 128):
+        '''
+        cache_size bounds the number of row sets whose elimination results are kept
+        '''
         super().__init__()
+        self.reduction_cache = LRUCache(cache_size)
 
     def split_key(self, key, n, k):
         '''
         Generates k-vector X and corresponding Pascal Matrix A
-        Then, compute y vector: Ax = y
+        Then, compute y vector: Ax = y (mod p)
         
         Key i = [i-th row of Pascal Matrix, y[i]]
         '''
+        return self.split_keys([key], n, k)[0]
 
-        # Generate x vector
-        x = [int.from_bytes(key, byteorder = sys.byteorder)]
-        for i in range(k-1):
-            x.append(random.randint(0, 2**256))
-        x = np.array(x)
-
-        # Generate Pascal Matrix
-        A = np.ones((n, k)).astype(int)
-        for r in range(1, n):
-            for c in range(1, k):
-                A[r,c] = A[r,c-1] + A[r-1,c]
+    def split_keys(self, keys, n, k):
+        '''
+        Splits many AES keys with one call
+        The Pascal Matrix is built once per (n, k) by the dealer, and random coordinates for all keys are drawn with a single read
 
-        # Generate y vector, where Ax = y
-        y = np.dot(A, x)
+        Returns a list holding the output of split_key for each key
+        '''
+        return self.dealer(n, k).split(keys)
 
-        # Split keys
-        keys = [A[i].tolist() + [y[i]] for i in range(n)]
+    def make_dealer(self, n, k):
+        '''
+        Builds the dealer of (n, k), see BlakleyDealer
+        '''
+        return BlakleyDealer(self, n, k)
 
-        # Return keys
-        return keys
+    def pascal(self, n, k):
+        '''
+        Returns the n x k Pascal Matrix
+        Entries grow quickly with n and k, so they are kept as native Python ints
+        '''
+        A = [[1] * k for r in range(n)]
+        for r in range(1, n):
+            for c in range(1, k):
+                A[r][c] = A[r][c-1] + A[r-1][c]
+        return A
 
     def combine_keys(self, keys):
         '''
-        Generate partial, square Pascal Matrix B from first k keys
-        Extract first k y values
-        Solve for x in Bx = y
+        Generate partial Pascal Matrix B and y vector from all given keys
+        Solve for x in Bx = y (mod p) via Gaussian elimination, using any k linearly independent keys
         
         Key = x[0]
         '''
 
         k = len(keys[0])-1
         if k > len(keys):
-            raise Exception("Insufficient keys provided for decryption. Please ensure the first {} keys are valid.".format(k))
-
-        # Generate matrix and y vector from keys, filter for first k keys
-        B = np.matrix([keys[i][:-1] for i in range(k)])[:k]
-        y = np.array([keys[i][-1] for i in range(k)])[:k]
+            raise Exception("Insufficient keys provided for decryption. Please ensure at least {} valid keys are provided.".format(k))
 
-        if np.linalg.matrix_rank(B) != k:
-            raise Exception("Keys provided are not linearly independent. Please ensure the first {} keys are valid.".format(k))
+        # Generate matrix and y vector from keys
+        # Sort by row so that every ordering of the same quorum shares a cache entry
+        keys = sorted(keys, key = lambda key: key[:-1])
+        B = tuple(tuple(key[:-1]) for key in keys)
+        y = [key[-1] for key in keys]
 
-        # Solve simultaneous equation: Bx = y
-        #
-        # Implementation notes:
-        # Problem 1:    Currently, no math packages can solve linear system of equations with arbitrary length numbers
-        #               But, y is made up of values that are up to 256 bits long
-        # Workaround:   Since elements in B is invertible, find B^-1 (invB)
-        #               Use scipy since numpy doesn't have in-built inv function
-        # Problem 2:    invB may contain fractions
-        # Workaround 2: Since elements in B are integers, det(B) is an integer.
-        #               Using invB = adj(B)/det(B) definition, defer division by det(B) till after multiplying with y
-        invB = scipy.linalg.inv(B)
-        detB = round(scipy.linalg.det(B))
-
-        # Secret S = AES key = invA[0] * y (since we only care about x[0])
+        # Solve simultaneous equation: Bx = y (mod p)
         #
         # Implementation notes:
-        # type(round(detB * invB[0][0]))        -> float64
-        # type(int(round(detB * invB[0][0])))   -> native Python int
-        # type(round(detB))                     -> native Python int
-        # Need to use // instead of / to maintain numerical precision
-        S = sum(int(round(detB * invB[0][i])) * y[i] for i in range(k)) // round(detB)
+        # Solving over GF(p) keeps every intermediate value exact and below p, unlike floating point inversion of B
+        # With R * B = [I_k, 0], x[0] = R[0] * y, and the system is consistent iff R[k:] * y = 0
+        # Only these rows of R are cached. Secret S < 2^256 < p, so x[0] mod p is exactly S
+        first, checks = self.reduction_cache.lookup(B, lambda: self.reduction(B, k))
+        if any(dot(row, y) % self.p != 0 for row in checks):
+            raise Exception("Keys provided are inconsistent. Please ensure all keys are valid.")
+
+        # Secret S = AES key = x[0]
+        S = dot(first, y) % self.p
         key = S.to_bytes(32, byteorder = sys.byteorder)
 
         # Return key
-        return key
\ No newline at end of file
+        return key
+
+    def combine_keys_batch(self, shares_by_secret):
+        '''
+        Combines many sets of shares with one call
+        Sets of shares from the same quorum (same rows) share one elimination, whose rows R[0] and R[k:]
+        are applied column by column to the y values of all their secrets
+
+        Returns a list holding the output of combine_keys for each set of shares
+        '''
+        groups = {}
+        for i, keys in enumerate(shares_by_secret):
+            groups.setdefault(tuple(tuple(key[:-1]) for key in keys), []).append(i)
+
+        result = [None] * len(shares_by_secret)
+        for rows, indices in groups.items():
+            k = len(rows[0])
+            if k > len(rows):
+                raise Exception("Insufficient keys provided for decryption. Please ensure at least {} valid keys are provided.".format(k))
+
+            # Sort by row so that every ordering of the same quorum shares a cache entry
+            order = sorted(range(len(rows)), key = rows.__getitem__)
+            B = tuple(rows[j] for j in order)
+            first, checks = self.reduction_cache.lookup(B, lambda: self.reduction(B, k))
+
+            # y[j] holds y of share j of every secret in the group
+            y = [[shares_by_secret[i][j][-1] for i in indices] for j in order]
+            if any(r % self.p != 0 for row in checks for r in dot_columns(row, y)):
+                raise Exception("Keys provided are inconsistent. Please ensure all keys are valid.")
+
+            for i, S in zip(indices, dot_columns(first, y)):
+                result[i] = (S % self.p).to_bytes(32, byteorder = sys.byteorder)
+        return result
+
+    def add_keys(self, keys, k, ids):
+        '''
+        Solves for x from the given keys as in combine_keys, then intersects x with the hyperplanes of the Pascal Matrix rows for ids
+
+        Key i = [i-th row of Pascal Matrix, y[i]]
+        '''
+        if any(i < 1 for i in ids):
+            raise Exception("Key ids must be at least 1. Please ensure all key ids are valid.")
+        x = self.solve(keys)
+        A = self.pascal(max(ids), len(x))
+        return [A[i-1] + [dot(A[i-1], x) % self.p] for i in ids]
+
+    def refresh_keys(self, keys, k):
+        '''
+        Solves for x from the given keys, then moves it to x' = x + (0, random z[1..k-1]), so x'[0] = S is kept
+        Keys are replaced by their hyperplanes shifted to pass through x'
+
+        Key i = [i-th row of Pascal Matrix, y'[i]]
+        '''
+        x = self.solve(keys)
+        x = [x[0]] + [(xi + zi) % self.p for xi, zi in zip(x[1:], random_ints(len(x) - 1))]
+        return [key[:-1] + [dot(key[:-1], x) % self.p] for key in keys]
+
+    def solve(self, keys):
+        '''
+        Returns the whole k-vector x that the keys intersect at
+        Throws exception if < k valid keys are given or the keys are inconsistent
+        '''
+        k = len(keys[0])-1
+        if k > len(keys):
+            raise Exception("Insufficient keys provided. Please ensure at least {} valid keys are provided.".format(k))
+        return solve_mod([key[:-1] for key in keys], [key[-1] for key in keys], self.p)
+
+    def reduction(self, B, k):
+        '''
+        Returns rows of the Gauss-Jordan row operations R of B needed by combine_keys: (R[0], R[k:])
+        '''
+        R = reduce_mod(B, self.p)
+        return R[0], R[k:]
+
+    def cache_info(self):
+        '''
+        Returns hit/miss statistics of the elimination cache
+        '''
+        return self.reduction_cache.info()
+
+class BlakleyDealer(Dealer):
+    '''
+    Splits keys for one (n, k) of BlakleySSS, sharing the n x k Pascal Matrix across splits
+
+    Implementation notes:
+    Rows are also kept reduced mod p, so y[i] is a dot product of numbers below p even where Pascal entries outgrow p
+    Keys still hold the unreduced rows, as in keys split without a dealer
+    y is computed one row of A at a time for all keys (coordinate j of every key in one list), so each step is a single map over a column
+    '''
+
+    def __init__(self, sss, n, k):
+        super().__init__(sss, n, k)
+        self.A = sss.pascal(n, k)
+        self.A_p = [[a % sss.p for a in row] for row in self.A]
+        self.nbytes = table_nbytes(self.A) + table_nbytes(self.A_p)
+
+    def split(self, keys):
+        '''
+        Splits many AES keys, like BlakleySSS.split_keys
+
+        Key i = [i-th row of Pascal Matrix, y[i]]
+        '''
+        k, m = self.k, len(keys)
+
+        # Generate random coordinates x[1..k-1] for all keys
+        # x[j] holds coordinate j of every key, x[0] = S
+        r = random_ints((k-1) * m)
+        x = [[int.from_bytes(key, byteorder = sys.byteorder) for key in keys]] + [r[j*m:(j+1)*m] for j in range(k-1)]
+
+        # Generate y vector of every key, where Ax = y (mod p), one row of A at a time
+        ys = [list(map(mod, dot_columns(row_p, x), repeat(self.sss.p))) for row_p in self.A_p]
+
+        # Split keys
+        return [[row + [y] for row, y in zip(self.A, column)] for column in zip(*ys)]
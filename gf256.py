@@ -0,0 +1,272 @@
+import numpy as np
+from sss import *
+
+# Implementation notes:
+# GF(2^8) is built from the AES polynomial x^8 + x^4 + x^3 + x + 1 (0x11b) with generator 3
+# Multiplication goes through log/exp tables: a * b = EXP[LOG[a] + LOG[b]] for non-zero a, b
+# MUL[a] is the full row of products a * b for b = 0, ... , 255, so MUL[a][v] multiplies a whole
+# uint8 array v by the scalar a with a single NumPy fancy indexing operation
+def gf_tables():
+    '''
+    Returns EXP, LOG and MUL tables of GF(2^8)
+    EXP is doubled in length so that EXP[LOG[a] + LOG[b]] never needs a modulo 255
+    '''
+    EXP = np.zeros(512, dtype = np.uint8)
+    LOG = np.zeros(256, dtype = np.int64)
+    value = 1
+    for i in range(255):
+        EXP[i] = value
+        LOG[value] = i
+        # value * 3 = value * 2 + value, where value * 2 is a shift reduced by the AES polynomial
+        value ^= (value << 1) ^ (0x11b if value & 0x80 else 0)
+    EXP[255:510] = EXP[:255]
+
+    MUL = EXP[LOG[:, None] + LOG[None, :]]
+    MUL[0, :] = 0
+    MUL[:, 0] = 0
+    return EXP, LOG, MUL
+
+EXP, LOG, MUL = gf_tables()
+
+def gf_mul(a, b):
+    '''
+    Returns a * b in GF(2^8)
+    '''
+    return int(MUL[a, b])
+
+def gf_inv(a):
+    '''
+    Returns the multiplicative inverse of a != 0 in GF(2^8)
+    '''
+    return int(EXP[255 - LOG[a]])
+
+def gf_lagrange(x):
+    '''
+    Returns the Lagrange basis polynomials evaluated at 0, i.e. l_j(0) for every j, in GF(2^8)
+    l_j(0) = prod x[m] / (x[m] - x[j]) over m != j, where subtraction is XOR
+    '''
+    if len(set(x)) != len(x):
+        raise Exception("Keys with duplicate x values were provided. Please ensure all keys are distinct.")
+
+    l = []
+    for j in range(len(x)):
+        num, den = 1, 1
+        for m in range(len(x)):
+            if m != j:
+                num = gf_mul(num, x[m])
+                den = gf_mul(den, x[m] ^ x[j])
+        l.append(gf_mul(num, gf_inv(den)))
+    return l
+
+def gf_pow(a, e):
+    '''
+    Returns a^e in GF(2^8)
+    '''
+    result = 1
+    for _ in range(e):
+        result = gf_mul(result, a)
+    return result
+
+def gf_inverse_matrix(A):
+    '''
+    Returns the inverse of the square matrix A over GF(2^8) via Gauss-Jordan elimination
+    Throws exception if A is singular
+    '''
+    k = len(A)
+    M = [list(row) + [int(r == c) for c in range(k)] for r, row in enumerate(A)]
+
+    for c in range(k):
+        # Find a row with a non-zero entry in column c
+        pivot = next((r for r in range(c, k) if M[r][c] != 0), None)
+        if pivot is None:
+            raise Exception("Matrix is singular over GF(2^8).")
+        M[c], M[pivot] = M[pivot], M[c]
+
+        # Normalise pivot row, then eliminate column c from every other row (subtraction is XOR)
+        inv = gf_inv(M[c][c])
+        M[c] = [gf_mul(v, inv) for v in M[c]]
+        for r in range(k):
+            if r != c and M[r][c] != 0:
+                f = M[r][c]
+                M[r] = [v ^ gf_mul(f, w) for v, w in zip(M[r], M[c])]
+
+    return [row[k:] for row in M]
+
+class GF256SSS(SSS):
+    '''
+    Byte-wise Shamir Secret Sharing Scheme over GF(2^8)
+    Paper: Shamir, A. (1979). How to share a secret. Communications of the ACM, 22(11), 612-613.
+
+    Key idea:
+    Same as ShamirSSS, but every byte of the secret is shared on its own with a random (k-1) degree polynomial over GF(2^8)
+    Shares are exactly as long as the secret, so arbitrary payloads (not just the AES key) can be split across custodians
+
+    n keys = q(i) for i = 1, 2, ... , n, evaluated for every byte position
+    >= k keys can reconstruct every byte via Lagrange interpolation
+    < k keys insufficient to reconstruct any byte
+
+    Conventions:
+    All byte positions are processed together as NumPy uint8 columns, using the MUL lookup table
+    At most 255 shares, as x has to be a non-zero element of GF(2^8)
+    '''
+
+    name = 'GF256'
+
+    def __init__(self):
+        super().__init__()
+
+    def split_key(self, key, n, k):
+        '''
+        Splits AES key byte-wise via split_data
+
+        Key i = [i, byte 1 of q(i), ... , byte 32 of q(i)]
+        '''
+        return [[x] + y.tolist() for x, y in self.split_data(key, n, k)]
+
+    def combine_keys(self, keys):
+        '''
+        Combines keys byte-wise via combine_data
+
+        Key = q(0) for every byte position
+        '''
+        return self.combine_data([(key[0], np.array(key[1:], dtype = np.uint8)) for key in keys])
+
+    def split_keys(self, keys, n, k):
+        '''
+        Splits many AES keys with one call, by splitting their concatenation with a single split_data
+
+        Returns a list holding the output of split_key for each key
+        '''
+        shares = self.split_data(b''.join(keys), n, k)
+        offsets = [0]
+        for key in keys:
+            offsets.append(offsets[-1] + len(key))
+        return [[[x] + y[offsets[i]:offsets[i+1]].tolist() for x, y in shares] for i in range(len(keys))]
+
+    def combine_keys_batch(self, shares_by_secret):
+        '''
+        Combines many sets of shares with one call
+        Sets of shares from the same quorum (same x values in the same order) are concatenated and combined with a single combine_data
+
+        Returns a list holding the output of combine_keys for each set of shares
+        '''
+        groups = {}
+        for i, keys in enumerate(shares_by_secret):
+            groups.setdefault(tuple(key[0] for key in keys), []).append(i)
+
+        result = [None] * len(shares_by_secret)
+        for x, indices in groups.items():
+            lengths = [len(shares_by_secret[i][0]) - 1 for i in indices]
+            y = np.array([[v for i in indices for v in shares_by_secret[i][j][1:]] for j in range(len(x))], dtype = np.uint8)
+            data = self.combine_data(list(zip(x, y)))
+            offset = 0
+            for i, length in zip(indices, lengths):
+                result[i] = data[offset:offset+length]
+                offset += length
+        return result
+
+    def add_keys(self, keys, k, ids):
+        '''
+        Evaluates q(x) at x = id for every id and byte position, using k of the given keys
+        Lagrange interpolation at z equals interpolation at 0 after shifting every x by z (x XOR z), so combine_data is reused
+
+        Key i = [i, byte 1 of q(i), ... , byte 32 of q(i)]
+        '''
+        if len(keys) < k:
+            raise Exception("Insufficient keys provided. Please ensure at least {} valid keys are provided.".format(k))
+        # q(0) is the secret itself, and x has to be a non-zero element of GF(2^8)
+        if any(not 1 <= z <= 255 for z in ids):
+            raise Exception("Key ids must be between 1 and 255. Please ensure all key ids are valid.")
+
+        keys = sorted(keys, key = lambda key: key[0])[:k]
+        y = [np.array(key[1:], dtype = np.uint8) for key in keys]
+        return [[z] + list(self.combine_data([(key[0] ^ z, yj) for key, yj in zip(keys, y)])) for z in ids]
+
+    def refresh_keys(self, keys, k):
+        '''
+        Adds byte-wise shares of an all-zero secret to every key, so q(0) is kept but q(x) changes everywhere else
+
+        Key i = [i, byte 1 of q(i) + d(i), ... , byte 32 of q(i) + d(i)]
+        '''
+        zero = dict(self.split_data(bytes(len(keys[0]) - 1), max(key[0] for key in keys), k))
+        return [[key[0]] + (np.array(key[1:], dtype = np.uint8) ^ zero[key[0]]).tolist() for key in keys]
+
+    def split_data(self, data, n, k):
+        '''
+        Generates a random (k-1) degree polynomial per byte of data with a[0] = that byte
+        Sample all polynomials at i = 1, 2, ... , n via Horner's rule, one uint8 column operation per coefficient
+
+        Returns [(i, q(i) as uint8 array)]
+        '''
+        assert (1 <= k <= n <= 255), "GF256SSS needs 1 <= k <= n <= 255."
+
+        # a[0] = secret bytes, a[1..k-1] = random bytes
+        secret = np.frombuffer(data, dtype = np.uint8)
+        a = np.frombuffer(Random.new().read((k-1) * len(secret)), dtype = np.uint8).reshape(k-1, len(secret))
+
+        shares = []
+        for x in range(1, n+1):
+            row = MUL[x]
+            y = np.zeros(len(secret), dtype = np.uint8)
+            for c in a[::-1]:
+                y = row.take(y)
+                y ^= c
+            y = row.take(y)
+            y ^= secret
+            shares.append((x, y))
+        return shares
+
+    def combine_data(self, shares):
+        '''
+        Apply Lagrange interpolation at 0 to every byte position at once
+
+        Returns data = q(0) as bytes
+        '''
+        x = [int(xi) for xi, _ in shares]
+        l = gf_lagrange(x)
+
+        data = np.zeros(len(shares[0][1]), dtype = np.uint8)
+        for lj, (_, y) in zip(l, shares):
+            data ^= MUL[lj].take(y)
+        return data.tobytes()
+
+    def split_file(self, infile, outfile, n, k, blocksize = BLOCKSIZE):
+        '''
+        Splits the contents of infile into n share files outfile.1, ... , outfile.n
+        Any k of them can restore infile via combine_files. infile is processed blocksize bytes at a time
+
+        Share file i = [1 byte: i, q(i) for every byte of infile]
+        '''
+        outs = [open("{}.{}".format(outfile, x), 'wb') for x in range(1, n+1)]
+        try:
+            for x, f in enumerate(outs, 1):
+                f.write(bytes([x]))
+            with open(infile, 'rb') as fin:
+                block = fin.read(blocksize)
+                while block:
+                    for (x, y), f in zip(self.split_data(block, n, k), outs):
+                        f.write(y.tobytes())
+                    block = fin.read(blocksize)
+        finally:
+            for f in outs:
+                f.close()
+
+    def combine_files(self, sharefiles, outfile, blocksize = BLOCKSIZE):
+        '''
+        Combines share files written by split_file into outfile, blocksize bytes at a time
+        Will only succeed if >= k valid share files are provided
+        '''
+        ins = [open(sharefile, 'rb') for sharefile in sharefiles]
+        try:
+            x = [f.read(1)[0] for f in ins]
+            with open(outfile, 'wb') as fout:
+                while True:
+                    blocks = [f.read(blocksize) for f in ins]
+                    if not blocks[0]:
+                        break
+                    if any(len(block) != len(blocks[0]) for block in blocks):
+                        raise Exception("Share files have different lengths. Please ensure all share files are valid.")
+                    fout.write(self.combine_data([(xi, np.frombuffer(block, dtype = np.uint8)) for xi, block in zip(x, blocks)]))
+        finally:
+            for f in ins:
+                f.close()
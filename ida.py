@@ -0,0 +1,182 @@
+import collections, hashlib, os, struct
+import numpy as np
+from sss import *
+from gf256 import *
+
+# Information Dispersal Algorithm (IDA)
+# Paper: Rabin, M. O. (1989). Efficient dispersal of information for security, load balancing, and fault tolerance. Journal of the ACM, 36(2), 335-348.
+# Paper: Krawczyk, H. (1993, August). Distributed fingerprints and secure information dispersal. In Proceedings of the twelfth annual ACM symposium on Principles of distributed computing (pp. 207-218). ACM.
+#
+# Key idea:
+# Cut the data into rows of k bytes, and treat each row as the coefficients of a (k-1) degree polynomial over GF(2^8)
+# Fragment i holds that polynomial evaluated at x = i for every row, so every fragment is 1/k of the data
+# >= k fragments give k evaluations per row, which determine its coefficients via the inverse Vandermonde matrix
+#
+# Conventions:
+# Fragment file = [header, fragment bytes]
+# Header = [magic "IDA1", x, n, k, length of data (8 bytes little-endian), SHA-256 fingerprints of all n fragments]
+# Every fragment carries the fingerprints of all fragments (Krawczyk's distributed fingerprints), so a corrupt
+# fragment is detected by comparing its hash with the fingerprints that the majority of fragments agree on
+# IDA only provides availability, not secrecy: fragments of plaintext leak plaintext, so SSS disperses ciphertext
+MAGIC = b'IDA1'
+HEADER = struct.Struct('<4sBBBQ')
+
+def header_size(n):
+    '''
+    Returns the size of a fragment header in bytes
+    '''
+    return HEADER.size + 32 * n
+
+def disperse(infile, outfile, n, k, blocksize = BLOCKSIZE, crypt = None):
+    '''
+    Disperses infile into n fragment files outfile.1, ... , outfile.n, any k of which can rebuild it via recover
+    infile is processed blocksize bytes (rounded down to a multiple of k) at a time
+    If given, every block is passed through crypt (e.g. the encrypt method of a stateful cipher object) before dispersal
+    '''
+    assert (1 <= k <= n <= 255), "IDA needs 1 <= k <= n <= 255."
+    blocksize = max(blocksize // k, 1) * k
+
+    length = os.path.getsize(infile)
+    outs = [open("{}.{}".format(outfile, x), 'wb') for x in range(1, n+1)]
+    hashes = [hashlib.sha256() for _ in range(n)]
+    try:
+        # Reserve space for headers, which can only be written once all fingerprints are known
+        for f in outs:
+            f.write(bytes(header_size(n)))
+
+        with open(infile, 'rb') as fin:
+            block = fin.read(blocksize)
+            while block:
+                if crypt is not None:
+                    block = crypt(block)
+
+                # Pad last block with zeros to a multiple of k, then lay out row coefficients as k columns
+                block += bytes(-len(block) % k)
+                a = np.frombuffer(block, dtype = np.uint8).reshape(-1, k).T
+
+                # Evaluate every row polynomial at x = 1, 2, ... , n via Horner's rule
+                for x, f, h in zip(range(1, n+1), outs, hashes):
+                    row = MUL[x]
+                    y = a[k-1].copy()
+                    for j in range(k-2, -1, -1):
+                        y = row.take(y)
+                        y ^= a[j]
+                    f.write(y.tobytes())
+                    h.update(y.tobytes())
+
+                block = fin.read(blocksize)
+
+        # Write headers
+        fingerprints = b''.join(h.digest() for h in hashes)
+        for x, f in zip(range(1, n+1), outs):
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, x, n, k, length) + fingerprints)
+    finally:
+        for f in outs:
+            f.close()
+
+def read_header(fragfile):
+    '''
+    Returns (x, n, k, length, fingerprints) stored in the header of fragfile
+    '''
+    with open(fragfile, 'rb') as f:
+        magic, x, n, k, length = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise Exception("{} is not an IDA fragment file.".format(fragfile))
+        fingerprints = f.read(32 * n)
+    return x, n, k, length, [fingerprints[32*i:32*(i+1)] for i in range(n)]
+
+def verify(fragfiles, blocksize = BLOCKSIZE):
+    '''
+    Checks every fragment file against the fingerprints that the majority of fragments agree on
+
+    Returns (good fragment files, bad fragment files)
+    '''
+    headers = {}
+    for fragfile in fragfiles:
+        try:
+            headers[fragfile] = read_header(fragfile)
+        except Exception:
+            pass
+
+    if not headers:
+        return [], list(fragfiles)
+
+    # Majority vote on (n, k, length, fingerprints), as corrupt fragments may carry corrupt headers
+    votes = collections.Counter((n, k, length, tuple(fp)) for x, n, k, length, fp in headers.values())
+    n, k, length, fingerprints = votes.most_common(1)[0][0]
+
+    good, bad = [], []
+    for fragfile in fragfiles:
+        if fragfile not in headers or headers[fragfile][1:4] != (n, k, length) or not 1 <= headers[fragfile][0] <= n:
+            bad.append(fragfile)
+            continue
+
+        h = hashlib.sha256()
+        with open(fragfile, 'rb') as f:
+            f.seek(header_size(n))
+            chunk = f.read(blocksize)
+            while chunk:
+                h.update(chunk)
+                chunk = f.read(blocksize)
+        if h.digest() == fingerprints[headers[fragfile][0] - 1]:
+            good.append(fragfile)
+        else:
+            bad.append(fragfile)
+    return good, bad
+
+def recover(fragfiles, outfile, blocksize = BLOCKSIZE, crypt = None):
+    '''
+    Rebuilds the data dispersed by disperse from any k valid fragment files into outfile
+    Fragments failing their fingerprint check are discarded first
+    If given, every recovered block is passed through crypt (e.g. the decrypt method of a stateful cipher object) before writing
+
+    Returns the list of fragment files that were discarded
+    '''
+    good, bad = verify(fragfiles, blocksize)
+    if not good:
+        raise Exception("No valid fragments provided. Please ensure the fragment files are valid.")
+
+    # Use k fragments with distinct x values
+    _, n, k, length, _ = read_header(good[0])
+    chosen = {}
+    for fragfile in good:
+        chosen.setdefault(read_header(fragfile)[0], fragfile)
+    if len(chosen) < k:
+        raise Exception("Insufficient valid fragments provided. Please ensure at least {} valid fragments are provided.".format(k))
+    x = sorted(chosen)[:k]
+
+    # Rows = Vandermonde matrix V * coefficients, so coefficients = V^-1 * rows
+    Vinv = gf_inverse_matrix([[gf_pow(xi, j) for j in range(k)] for xi in x])
+
+    ins = [open(chosen[xi], 'rb') for xi in x]
+    try:
+        for f in ins:
+            f.seek(header_size(n))
+
+        # Every fragment holds one byte per row of k data bytes
+        rows = max(blocksize // k, 1)
+        remaining = length
+        with open(outfile, 'wb') as fout:
+            while remaining > 0:
+                y = [np.frombuffer(f.read(rows), dtype = np.uint8) for f in ins]
+                if len(y[0]) == 0 or any(len(ym) != len(y[0]) for ym in y):
+                    raise Exception("Fragment files are truncated. Please ensure the fragment files are valid.")
+                a = np.empty((len(y[0]), k), dtype = np.uint8)
+                for j in range(k):
+                    c = np.zeros(len(y[0]), dtype = np.uint8)
+                    for m in range(k):
+                        c ^= MUL[Vinv[j][m]].take(y[m])
+                    a[:, j] = c
+
+                # Strip padding of the last block
+                block = a.tobytes()[:remaining]
+                remaining -= len(block)
+                if crypt is not None:
+                    block = crypt(block)
+                fout.write(block)
+    finally:
+        for f in ins:
+            f.close()
+
+    return bad
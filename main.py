@@ -1,23 +1,41 @@
-import argparse
-from blakley import *
-from shamir import *
-from asmuthbloom import *
+import argparse, json, os, shlex, sys, time
+from sss import *
+from profiler import Profiler
+import schemes
 
 ####################
 # Argument Parsing #
 ####################
 
 parser = argparse.ArgumentParser()
-parser.add_argument("-scheme", help = "Select SSS scheme: 'Blakley', 'Shamir' or 'AsmuthBloom'")
+parser.add_argument("-scheme", help = "Select SSS scheme: 'Blakley', 'Shamir', 'AsmuthBloom' or 'GF256'. Only the selected scheme is loaded")
 parser.add_argument("-encrypt", help = "Enable encrypt mode", action = "store_true")
 parser.add_argument("-decrypt", help = "Enable decrypt mode", action = "store_true")
 parser.add_argument("-infile", help = "Name of input file. For encryption, infile should hold plaintext. For decryption, infile should hold ciphertext.")
 parser.add_argument("-outfile", help = "Name of output file. For encryption, ciphertext will be written here. For decryption, plaintext will be written here.")
 parser.add_argument("-keysfile", help = "Name of keys file. For encryption, n keys will be stored here. Decryption will only work if at least k valid keys are provided here.")
+parser.add_argument("-reshare", help = "Enable reshare mode: Read at least k keys from keysfile and write keys 1, ... , n for the same secret to outfile, without touching the encrypted file", action = "store_true")
+parser.add_argument("-refresh", help = "With -reshare, re-randomise all n keys, so that keys from before cannot be combined with the new ones", action = "store_true")
+parser.add_argument("-indir", help = "Name of input directory. Encrypts/decrypts every file below it instead of a single infile, using a pool of processes.")
+parser.add_argument("-outdir", help = "Name of output directory for -indir. Files keep their relative paths. Encryption writes n manifests keysfile.1, ... , keysfile.n, manifest i holding key i of every file. For decryption, keysfile should hold a comma separated list of at least k manifests.")
 parser.add_argument("-n", help = "Total number of secret keys generated during encryption", type = int)
-parser.add_argument("-k", help = "Decryption threshold: At least k out of n keys will be needed to decrypt", type = int)
-args = parser.parse_args()
-print("Arguments: {}".format(args))
+parser.add_argument("-k", help = "Decryption threshold: At least k out of n keys will be needed to decrypt. For decryption with the 'Shamir' scheme, giving k locates and discards up to (t-k)/2 corrupt keys among t keys", type = int)
+parser.add_argument("-blocksize", help = "Number of bytes read, encrypted/decrypted and written at a time. Peak memory use is bounded by this (default: {})".format(BLOCKSIZE), type = int, default = BLOCKSIZE)
+parser.add_argument("-workers", help = "Number of threads used to encrypt/decrypt blocks in parallel (default: 1). With -indir, number of processes used to encrypt/decrypt files in parallel (default: one per core)", type = int)
+parser.add_argument("-binary", help = "Store keys in the compact binary format instead of text. Decryption detects the format automatically.", action = "store_true")
+parser.add_argument("-payload", help = "Share the file contents directly instead of the AES key ('GF256' scheme only). Encryption writes n share files outfile.1, ... , outfile.n. For decryption, infile should hold a comma separated list of at least k share files.", action = "store_true")
+parser.add_argument("-disperse", help = "Disperse the ciphertext into n fragment files outfile.1, ... , outfile.n, each 1/k of its size, instead of writing it to outfile. For decryption, infile should hold a comma separated list of at least k fragment files.", action = "store_true")
+parser.add_argument("-aead", help = "Write an authenticated container (AES-256 GCM per block, with a key-check value) instead of plain AES-256 CTR ciphertext, so a wrong set of keys or a modified file is detected. Decryption detects the format automatically.", action = "store_true")
+parser.add_argument("-profile", help = "Print the wall time, bytes and key counts of every pipeline stage (read, AES, write, split, combine, ...) and cache statistics", action = "store_true")
+parser.add_argument("-metrics", help = "Name of file to write stage metrics to, in the Prometheus text format if it ends with .prom, else as JSON")
+parser.add_argument("-io", help = "I/O backend: 'stream' (read/write blocks) or 'mmap' (memory-mapped, zero-copy) (default: stream)", choices = BACKENDS, default = 'stream')
+parser.add_argument("-batch", help = "Enable batch mode: Read one job per line from stdin, each given as the arguments of a single run (e.g. -scheme Shamir -decrypt -infile ...), and run them all in this process. Jobs are run as lines arrive, so stdin can also be a pipe kept open by a long-running producer", action = "store_true")
+
+def report(done, total, nbytes, seconds):
+    '''
+    Prints progress and throughput of directory mode
+    '''
+    print("[{}/{}] {:.1f} MB in {:.3f} s, {:.1f} MB/s".format(done, total, nbytes / 2**20, seconds, nbytes / 2**20 / max(seconds, 1e-9)))
 
 #################################
 # Execute Secret Sharing Scheme #
@@ -38,31 +56,131 @@ Successful if and only if keys.txt contain >= 5 valid keys
 >>> diff lenna.png lenna_restored.png
 
 Files are identical!
+
+>>> printf '%s\\n' "-scheme Shamir -decrypt -infile a.enc -outfile a -keysfile a.keys" "-scheme Shamir -decrypt -infile b.enc -outfile b -keysfile b.keys" | python3 main.py -batch
+
+Runs both jobs in one process, paying interpreter start-up and imports once
 '''
 
-if args.scheme == 'Blakley' or args.scheme == 'Shamir' or args.scheme == 'AsmuthBloom':
-    # Select secret sharing scheme
-    if args.scheme == 'Blakley':
-        sss = BlakleySSS()
-    elif args.scheme == 'Shamir':
-        sss = ShamirSSS()
-    elif args.scheme == 'AsmuthBloom':
-        sss = AsmuthBloomSSS()
+def run(args, instances = None):
+    '''
+    Runs the job described by the parsed arguments args
+    If given, instances caches scheme objects by name across jobs, so that their per-quorum caches stay warm
+    '''
+    print("Arguments: {}".format(args))
+    if args.scheme not in schemes.SCHEMES:
+        print("Please select a Secret Sharing Scheme: 'Blakley', 'Shamir', 'AsmuthBloom' or 'GF256'")
+        return
+
+    # Select secret sharing scheme. Only its module is imported
+    if instances is None:
+        instances = {}
+    if args.scheme not in instances:
+        instances[args.scheme] = schemes.create(args.scheme)
+    sss = instances[args.scheme]
+    sss.profiler = Profiler(enabled = args.profile or args.metrics is not None)
 
     # Select mode
-    if args.encrypt and args.decrypt:
+    start = time.perf_counter()
+    if args.reshare:
+        # Generate keys 1, ... , n from a quorum of keys, optionally refreshing all of them
+        if args.n is None or args.k is None:
+            parser.error("-reshare requires -n and -k")
+        print("Resharing...")
+        keys = sss.add_keys(sss.load_keys(args.keysfile), args.k, range(1, args.n + 1))
+        if args.refresh:
+            keys = sss.refresh_keys(keys, args.k)
+        sss.store_keys(args.outfile, keys, args.n, args.k, args.binary)
+        print("Done! ({:.3f} s)".format(time.perf_counter() - start))
+    elif args.encrypt and args.decrypt:
         print("Invalid use mode: Cannot pick both encryption and decryption at the same time.")
     elif not args.encrypt and not args.decrypt:
         print("Invalid use mode: Please pick either the encryption or decryption mode.")
-    elif args.encrypt:
-        # Use AES-256 to encode infile and save into outfile, then split AES key into n keys
-        print("Encrypting...")
-        sss.encrypt(args.infile, args.outfile, args.keysfile, args.n, args.k)
+    elif args.payload and args.scheme != 'GF256':
+        print("Invalid use mode: Payload sharing is only supported by the 'GF256' scheme.")
+    elif args.indir:
+        # Encrypt/decrypt every file below indir to outdir, with one key per file
+        if args.encrypt:
+            print("Encrypting directory...")
+            sss.encrypt_tree(args.indir, args.outdir, args.keysfile, args.n, args.k, args.workers, args.blocksize, report)
+        else:
+            print("Decrypting directory...")
+            sss.decrypt_tree(args.indir, args.outdir, args.keysfile.split(','), args.workers, args.blocksize, report)
         print("Done!")
+    elif args.encrypt:
+        size = os.path.getsize(args.infile)
+        if args.payload:
+            # Split infile itself into n share files
+            print("Splitting...")
+            sss.split_file(args.infile, args.outfile, args.n, args.k, args.blocksize)
+        elif args.disperse:
+            # Use AES-256 to encode infile and disperse it into n fragments, then split AES key into n keys
+            print("Encrypting and dispersing...")
+            sss.encrypt_dispersed(args.infile, args.outfile, args.keysfile, args.n, args.k, args.blocksize, args.binary)
+        else:
+            # Use AES-256 to encode infile and save into outfile, then split AES key into n keys
+            print("Encrypting...")
+            sss.encrypt(args.infile, args.outfile, args.keysfile, args.n, args.k, args.blocksize, args.workers or 1, args.io, args.binary, args.aead)
+        seconds = time.perf_counter() - start
+        print("Done! ({:.3f} s, {:.1f} MB/s)".format(seconds, size / 2**20 / max(seconds, 1e-9)))
     else:
-        print("Decrypting...")
-        # Combine k keys into AES key and decrypt outfile
-        sss.decrypt(args.infile, args.outfile, args.keysfile)
-        print("Done!")
-else:
-    print("Please select a Secret Sharing Scheme: 'Blakley', 'Shamir' or 'AsmuthBloom'")
\ No newline at end of file
+        if args.payload:
+            # Combine share files back into outfile
+            print("Combining...")
+            sss.combine_files(args.infile.split(','), args.outfile, args.blocksize)
+        elif args.disperse:
+            # Rebuild ciphertext from fragments, combine k keys into AES key and decrypt it
+            print("Recovering and decrypting...")
+            bad = sss.decrypt_dispersed(args.infile.split(','), args.outfile, args.keysfile, args.blocksize)
+            if bad:
+                print("Discarded corrupt fragments: {}".format(bad))
+        else:
+            print("Decrypting...")
+            # Combine k keys into AES key and decrypt outfile
+            bad = sss.decrypt(args.infile, args.outfile, args.keysfile, args.blocksize, args.workers or 1, args.io, args.k)
+            if bad:
+                print("Discarded corrupt keys: {}".format(bad))
+        seconds = time.perf_counter() - start
+        size = os.path.getsize(args.outfile)
+        print("Done! ({:.3f} s, {:.1f} MB/s)".format(seconds, size / 2**20 / max(seconds, 1e-9)))
+
+    # Report stage breakdown
+    if args.profile:
+        print(sss.profiler.report())
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            if args.metrics.endswith('.prom'):
+                f.write(sss.profiler.to_prometheus())
+            else:
+                json.dump(sss.profiler.to_dict(), f, indent = 1)
+
+def run_batch(stream):
+    '''
+    Runs one job per line of stream, as in run. Empty lines and lines starting with # are skipped
+    A failing job is reported and does not stop the following ones
+
+    Returns the number of failed jobs
+    '''
+    instances, jobs, failed = {}, 0, 0
+    for line in iter(stream.readline, ''):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        jobs += 1
+        try:
+            run(parser.parse_args(shlex.split(line)), instances)
+        except SystemExit:
+            failed += 1
+            print("Job {} failed: Invalid arguments.".format(jobs))
+        except Exception as e:
+            failed += 1
+            print("Job {} failed: {}".format(jobs, e))
+        sys.stdout.flush()
+    print("Batch done! ({} jobs, {} failed)".format(jobs, failed))
+    return failed
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.batch:
+        sys.exit(1 if run_batch(sys.stdin) else 0)
+    run(args)
@@ -0,0 +1,142 @@
+from itertools import repeat
+from operator import mod
+from sss import mulinv
+
+# Number theory: primality testing and Chinese Remainder Theorem (CRT) over many moduli (AsmuthBloomSSS),
+# and multi-exponentiation (Feldman commitments of ShamirSSS)
+#
+# Conventions:
+# Product trees are built once per set of moduli and cached by the caller, so both directions
+# (CRT from remainders, remainders from an integer) only do reductions and multiplications along the tree
+
+# Source: https://en.wikipedia.org/wiki/Miller%E2%80%93Rabin_primality_test
+def is_probable_prime(n, bases = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)):
+    '''
+    Miller-Rabin primality test with the given bases
+    '''
+    if n < 2:
+        return False
+    for q in bases:
+        if n % q == 0:
+            return n == q
+
+    # n - 1 = d * 2^s with d odd
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+
+    for a in bases:
+        x = pow(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+# Source: https://en.wikipedia.org/wiki/Chinese_remainder_theorem#Computation
+def crt_tree(m):
+    '''
+    Builds a product tree over the pairwise coprime moduli m for use with crt
+    Leaf = (mi, 1, None, None, None)
+    Node = (product of moduli below, number of leaves in left subtree, left subtree, right subtree, inverse of left product mod right product)
+    '''
+    if len(m) == 1:
+        return (m[0], 1, None, None, None)
+
+    h = len(m) // 2
+    left, right = crt_tree(m[:h]), crt_tree(m[h:])
+    inv = mulinv(left[0] % right[0], right[0])
+    if inv is None:
+        raise Exception("Keys with moduli that are not pairwise coprime were provided. Please ensure all keys are distinct.")
+    return (left[0] * right[0], h, left, right, inv)
+
+def crt(tree, r):
+    '''
+    Returns the unique y mod (product of moduli) with y = r[i] (mod m[i]) for every leaf m[i] of tree
+    Solves both halves recursively, then merges them with a two-modulus Garner step:
+    y = yl + Ml * ((yr - yl) * Ml^-1 mod Mr)
+    '''
+    M, h, left, right, inv = tree
+    if left is None:
+        return r[0] % M
+
+    yl, yr = crt(left, r[:h]), crt(right, r[h:])
+    return yl + left[0] * ((yr - yl) * inv % right[0])
+
+def crt_columns(tree, columns):
+    '''
+    Runs crt for many residue vectors r at once, columns[i] holding r[i] of every vector
+    Every Garner step is a single pass over whole columns instead of a recursion per vector
+    '''
+    M, h, left, right, inv = tree
+    if left is None:
+        return [ri % M for ri in columns[0]]
+
+    yl, yr = crt_columns(left, columns[:h]), crt_columns(right, columns[h:])
+    Ml, Mr = left[0], right[0]
+    return [a + Ml * ((b - a) * inv % Mr) for a, b in zip(yl, yr)]
+
+def product_tree(m):
+    '''
+    Builds a product tree over the moduli m for use with remainders
+    Leaf = (mi, None, None)
+    Node = (product of moduli below, left subtree, right subtree)
+    '''
+    if len(m) == 1:
+        return (m[0], None, None)
+
+    h = len(m) // 2
+    left, right = product_tree(m[:h]), product_tree(m[h:])
+    return (left[0] * right[0], left, right)
+
+def remainders(tree, y):
+    '''
+    Returns [y mod m[i] for every leaf m[i] of tree], reducing y modulo the product of each subtree on the way down
+
+    Implementation notes:
+    Every level only reduces numbers about twice the size of its moduli, instead of reducing the whole y by every mi
+    '''
+    M, left, right = tree
+    y %= M
+    if left is None:
+        return [y]
+    return remainders(left, y) + remainders(right, y)
+
+def remainders_columns(tree, ys):
+    '''
+    Runs remainders for many y at once
+
+    Returns [[y mod m[i] for y in ys] for every leaf m[i] of tree]
+    '''
+    M, left, right = tree
+    ys = list(map(mod, ys, repeat(M)))
+    if left is None:
+        return [ys]
+    return remainders_columns(left, ys) + remainders_columns(right, ys)
+
+# Source: https://en.wikipedia.org/wiki/Exponentiation_by_squaring#Computation_by_simultaneous_exponentiation
+def multiexp(bases, exps, P, window = 4):
+    '''
+    Returns prod bases[i]^exps[i] (mod P) via Straus' simultaneous exponentiation
+    Bases are taken window at a time. Each window precomputes the products of all subsets of its bases,
+    then shares a single chain of squarings, multiplying in the subset whose exponent bits are set
+    '''
+    result = 1
+    for s in range(0, len(bases), window):
+        bs, es = bases[s:s+window], exps[s:s+window]
+        table = [1]
+        for b in bs:
+            table += [t * b % P for t in table]
+
+        acc = 1
+        for i in reversed(range(max(e.bit_length() for e in es))):
+            acc = acc * acc % P
+            subset = sum(((e >> i) & 1) << j for j, e in enumerate(es))
+            if subset:
+                acc = acc * table[subset] % P
+        result = result * acc % P
+    return result
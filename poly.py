@@ -0,0 +1,100 @@
+from sss import prod, mulinv, batch_mulinv
+
+# Polynomial arithmetic over GF(p) and Reed-Solomon decoding
+#
+# Conventions:
+# Polynomials are lists of coefficients in increasing degree, without zero leading coefficients. The zero polynomial is []
+
+def poly_trim(a):
+    '''
+    Strips zero leading coefficients of polynomial a (coefficients in increasing degree), in place
+    The zero polynomial is []
+    '''
+    while a and a[-1] == 0:
+        a.pop()
+    return a
+
+def poly_sub(a, b, p):
+    '''
+    Returns a - b (mod p)
+    '''
+    n = max(len(a), len(b))
+    a, b = a + [0] * (n - len(a)), b + [0] * (n - len(b))
+    return poly_trim([(u - v) % p for u, v in zip(a, b)])
+
+def poly_mul(a, b, p):
+    '''
+    Returns a * b (mod p)
+    '''
+    if not a or not b:
+        return []
+    c = [0] * (len(a) + len(b) - 1)
+    for i, u in enumerate(a):
+        for j, v in enumerate(b):
+            c[i+j] += u * v
+    return poly_trim([v % p for v in c])
+
+def poly_divmod(a, b, p):
+    '''
+    Returns (q, r) with a = q * b + r (mod p) and deg r < deg b
+    b must be non-zero
+    '''
+    r = poly_trim([v % p for v in a])
+    if len(r) < len(b):
+        return [], r
+    inv = mulinv(b[-1], p)
+    q = [0] * (len(r) - len(b) + 1)
+    for i in reversed(range(len(q))):
+        c = r[i + len(b) - 1] * inv % p
+        q[i] = c
+        if c:
+            for j, v in enumerate(b):
+                r[i+j] = (r[i+j] - c * v) % p
+    return poly_trim(q), poly_trim(r[:len(b) - 1])
+
+# Source: https://en.wikipedia.org/wiki/Reed%E2%80%93Solomon_error_correction#Gao_decoder
+def gao_decode(x, y, k, p):
+    '''
+    Finds the polynomial f of degree < k with f(x[i]) = y[i] for all but at most (t-k)/2 of the t points
+    Returns f, or None if more than (t-k)/2 points disagree with every such polynomial
+
+    1) g0 = prod (X - x[i]), g1 = interpolating polynomial of all t points (Lagrange)
+    2) Run the extended Euclidean algorithm on g0, g1 until the remainder g has degree < (t+k)/2,
+       tracking v with u * g0 + v * g1 = g
+    3) v vanishes on the bad points (error locator), and f = g / v if v divides g
+
+    Implementation notes:
+    Every step is polynomial arithmetic of degree <= t, so decoding costs O(t^2) operations instead of trying subsets
+    '''
+    t = len(x)
+
+    # g0 = prod (X - x[i])
+    g0 = [1]
+    for xi in x:
+        g0 = poly_mul(g0, [-xi % p, 1], p)
+
+    # g1 = sum y[i] * w[i] * g0 / (X - x[i]), w[i] = 1 / prod (x[i] - x[m]) over m != i
+    den = [prod([x[i] - x[m] for m in range(t) if m != i] or [1]) % p for i in range(t)]
+    if 0 in den:
+        raise Exception("Keys with duplicate x values were provided. Please ensure all keys are distinct.")
+    g1 = [0] * t
+    for xi, yi, wi in zip(x, y, batch_mulinv(den, p)):
+        c = yi * wi % p
+        # Synthetic division of g0 by (X - x[i])
+        q = 0
+        for j in reversed(range(t)):
+            q = (g0[j+1] + q * xi) % p
+            g1[j] += c * q
+    g1 = poly_trim([v % p for v in g1])
+
+    # Partial extended Euclidean algorithm
+    r0, r1, v0, v1 = g0, g1, [], [1]
+    while 2 * (len(r1) - 1) >= t + k:
+        q, r = poly_divmod(r0, r1, p)
+        r0, r1 = r1, r
+        v0, v1 = v1, poly_sub(v0, poly_mul(q, v1, p), p)
+
+    f, r = poly_divmod(r1, v1, p)
+    if r or len(f) > k:
+        return None
+    return f
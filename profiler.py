@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+
+# Per-stage profiling of the encrypt/decrypt pipelines
+#
+# Conventions:
+# Stages are named by what they do (keygen, read, aes, write, split, store, load, combine, correct, crypt)
+# Bytes count payload bytes passing through a stage, items count keys/shares or files
+
+class Profiler:
+    '''
+    Records wall time, bytes and item (key/share, file) counts of the stages of a pipeline, plus cache statistics
+    Stages are timed with "with profiler.stage(name, nbytes, items):". Totals are kept per stage name
+    If given, callback(name, seconds, nbytes, items) is called after every stage, e.g. to feed a log or an exporter
+
+    Implementation notes:
+    A disabled profiler returns one shared no-op context manager from stage, so instrumentation costs one method call per stage
+    '''
+
+    def __init__(self, enabled = True, callback = None):
+        self.enabled = enabled
+        self.callback = callback
+        self.stages = OrderedDict()
+        self.caches = {}
+
+    def stage(self, name, nbytes = 0, items = 0):
+        '''
+        Returns a context manager recording the wall time of its body as stage name
+        nbytes and items can also be set on the object it returns, once they are known inside the body
+        '''
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name, nbytes, items)
+
+    def record(self, name, seconds, nbytes = 0, items = 0):
+        '''
+        Adds one run of stage name to its totals
+        '''
+        totals = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'bytes': 0, 'items': 0})
+        totals['calls'] += 1
+        totals['seconds'] += seconds
+        totals['bytes'] += nbytes
+        totals['items'] += items
+        if self.callback is not None:
+            self.callback(name, seconds, nbytes, items)
+
+    def record_cache(self, name, info):
+        '''
+        Stores the latest statistics of cache name (see LRUCache.info)
+        '''
+        self.caches[name] = dict(info)
+
+    def to_dict(self):
+        '''
+        Returns all totals as a dictionary {"stages": {name: totals}, "caches": {name: statistics}}, e.g. for a JSON log
+        '''
+        return {'stages': {name: dict(totals) for name, totals in self.stages.items()}, 'caches': dict(self.caches)}
+
+    def to_prometheus(self, prefix = 'sss'):
+        '''
+        Returns all totals in the Prometheus text exposition format, e.g. for the textfile collector of a local node exporter
+        '''
+        lines = []
+        for metric, field, kind in [['stage_seconds_total', 'seconds', 'counter'], ['stage_bytes_total', 'bytes', 'counter'],
+                                    ['stage_items_total', 'items', 'counter'], ['stage_calls_total', 'calls', 'counter']]:
+            lines.append("# TYPE {}_{} {}".format(prefix, metric, kind))
+            for name, totals in self.stages.items():
+                lines.append('{}_{}{{stage="{}"}} {}'.format(prefix, metric, name, totals[field]))
+        for field in ['hits', 'misses', 'currsize']:
+            metric = "cache_{}".format(field if field == 'currsize' else field + '_total')
+            lines.append("# TYPE {}_{} {}".format(prefix, metric, 'gauge' if field == 'currsize' else 'counter'))
+            for name, info in self.caches.items():
+                lines.append('{}_{}{{cache="{}"}} {}'.format(prefix, metric, name, info[field]))
+        return "\n".join(lines) + "\n"
+
+    def report(self):
+        '''
+        Returns a human readable breakdown of all stages and caches
+        '''
+        total = sum(totals['seconds'] for totals in self.stages.values())
+        lines = ["{:<10} {:>6} {:>10} {:>7} {:>12} {:>10} {:>7}".format('Stage', 'Calls', 'Seconds', 'Share', 'MB', 'MB/s', 'Items')]
+        for name, totals in self.stages.items():
+            lines.append("{:<10} {:>6} {:>10.4f} {:>6.1f}% {:>12.2f} {:>10.1f} {:>7}".format(
+                name, totals['calls'], totals['seconds'], 100 * totals['seconds'] / max(total, 1e-12), totals['bytes'] / 2**20,
+                totals['bytes'] / 2**20 / max(totals['seconds'], 1e-12), totals['items']))
+        for name, info in self.caches.items():
+            lines.append("Cache {}: {} hits, {} misses, {}/{} entries".format(name, info['hits'], info['misses'], info['currsize'], info['maxsize']))
+        return "\n".join(lines)
+
+class Stage:
+    '''
+    Context manager timing one run of a stage for Profiler.stage
+    '''
+
+    def __init__(self, profiler, name, nbytes = 0, items = 0):
+        self.profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+        self.items = items
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start, self.nbytes, self.items)
+        return False
+
+class NullStage:
+    '''
+    Context manager of disabled profilers, which records nothing
+    '''
+    nbytes = items = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = NullStage()
+
+NULL_PROFILER = Profiler(enabled = False)
@@ -0,0 +1,29 @@
+import importlib
+from collections import OrderedDict
+
+# Scheme registry
+#
+# Maps scheme names to the module and class implementing them
+# Modules are only imported once their scheme is first requested, so e.g. a Shamir-only run never imports NumPy (needed by GF256)
+# New schemes register here, and their names are also used in binary keys files (see sharefile.py)
+SCHEMES = OrderedDict([
+    ('Blakley', ('blakley', 'BlakleySSS')),
+    ('Shamir', ('shamir', 'ShamirSSS')),
+    ('AsmuthBloom', ('asmuthbloom', 'AsmuthBloomSSS')),
+    ('GF256', ('gf256', 'GF256SSS')),
+])
+
+def get_scheme(name):
+    '''
+    Returns the class of scheme name, importing its module if needed
+    '''
+    if name not in SCHEMES:
+        raise Exception("Unknown scheme '{}'. Please pick one of {}.".format(name, list(SCHEMES)))
+    module, cls = SCHEMES[name]
+    return getattr(importlib.import_module(module), cls)
+
+def create(name, *args, **kwargs):
+    '''
+    Returns a new instance of scheme name, passing on args and kwargs to its constructor
+    '''
+    return get_scheme(name)(*args, **kwargs)
@@ -1,6 +1,9 @@
 import sys
+from itertools import repeat
+from operator import add, itemgetter, mod, mul
 from sss import *
-from Crypto.Random import random # A cryptographically strong version of Python's standard "random" module
+from poly import gao_decode
+from ntheory import multiexp
 
 class ShamirSSS(SSS):
     '''
@@ -18,10 +21,29 @@ class ShamirSSS(SSS):
     Conventions:
     Constant term in interpolating polynomial q(0) is the secret/key S
     Reconstruction via Lagrange interpolation
+    Shares form a Reed-Solomon codeword, so with t > k shares up to (t-k)/2 corrupt ones are located by Gao's decoder (correct_keys)
+    Lagrange coefficients only depend on the set of x values, so they are cached for repeated reconstructions by the same quorum
+
+    Verifiable mode (Feldman, P. (1987). A practical scheme for non-interactive verifiable secret sharing. In FOCS (pp. 427-438). IEEE.):
+    Dealer publishes commitments C_j = g^(a_j) (mod P) to the coefficients, where g generates the subgroup of order p mod prime P
+    Key [x, y] is valid iff g^y = prod C_j^(x^j) (mod P), which every custodian can check on their own
+    Commitments reveal g^S, so S stays as hard to find as a discrete logarithm in the 2048 bit group
     '''
 
-    def __init__(self):
+    name = 'Shamir'
+
+    # Group for commitments: P = r * p + 1 is the first 2048 bit prime of this form with r = 2^1791 + 2c, found at c = 651
+    # g = 2^r (mod P) != 1 has order p. Both depend on p, so they need to be recomputed if p is changed
+    commit_r = 2**1791 + 2 * 651
+    commit_P = commit_r * (2**257 - 93) + 1
+    commit_g = pow(2, commit_r, commit_P)
+
+    def __init__(self, cache_size = 128):
+        '''
+        cache_size bounds the number of x value sets whose Lagrange coefficients are kept
+        '''
         super().__init__()
+        self.lagrange_cache = LRUCache(cache_size)
 
     def split_key(self, key, n, k):
         '''
@@ -30,21 +52,51 @@ class ShamirSSS(SSS):
         
         Key i = [i, q(i)]
         '''
+        return self.split_keys([key], n, k)[0]
 
-        # Generate coefficient vector a
-        a = [int.from_bytes(key, byteorder = sys.byteorder)]
-        for i in range(k-1):
-            a.append(random.randint(0, 2**256))
+    def split_keys(self, keys, n, k):
+        '''
+        Splits many AES keys with one call, all sampled at the same points i = 1, 2, ... , n
+        Random coefficients for all keys are drawn with a single read
 
-        # Polynomial q(x) = a_0 + a_1 * x + a2 * x^2 + ... + a_(k-1) * x^(k-1) (mod p)
-        # Generate q(1), q(2), ... , q(n) (mod p)
-        keys = []
-        for i in range(1, n+1):
-            x = [i ** j for j in range(k)]
-            keys.append([i, sum(a[j] * x[j] % self.p for j in range(k)) % self.p])
+        Returns a list holding the output of split_key for each key
+        '''
+        return self.dealer(n, k).split(keys)
+
+    def make_dealer(self, n, k):
+        '''
+        Builds the dealer of (n, k), see ShamirDealer
+        '''
+        return ShamirDealer(self, n, k)
+
+    def coefficients(self, keys, k):
+        '''
+        Generates coefficient vectors a of random (k-1) degree polynomials with a[0] = S, one per key
+        '''
+        r = random_ints((k-1) * len(keys))
+        return [[int.from_bytes(key, byteorder = sys.byteorder)] + r[i*(k-1):(i+1)*(k-1)] for i, key in enumerate(keys)]
 
-        # Return keys
-        return keys
+    def evaluate(self, a, xs):
+        '''
+        Evaluates polynomial with coefficient vector a at every point in xs via Horner's rule
+
+        Returns [[x, q(x)] for x in xs]
+
+        Implementation notes:
+        Horner's rule needs k multiply-adds per point instead of k big powers x^j plus k reductions
+        Subquadratic multipoint evaluation (product trees) does not pay off here: with pure Python bignums,
+        its polynomial multiplications and divisions cost more than n * k multiply-adds for n, k in the hundreds
+        Share points x are small, so reduction mod p is delayed to the end: q(x) < p * (x+1)^k is only k * log2(x+1) bits larger than p,
+        and multiplying it by a small x is cheaper than a reduction per step
+        '''
+        a = a[::-1]
+        result = []
+        for x in xs:
+            y = 0
+            for c in a:
+                y = y * x + c
+            result.append([x, y % self.p])
+        return result
 
     def combine_keys(self, keys):
         '''
@@ -56,9 +108,10 @@ class ShamirSSS(SSS):
 
         # keys[i][0] = x value
         # keys[i][1] = q(x) value
-        k = len(keys)
-        x = [keys[i][0] for i in range(k)]
-        y = [keys[i][1] for i in range(k)]
+        # Sort by x value so that every ordering of the same quorum shares a cache entry
+        keys = sorted(keys, key = lambda key: key[0])
+        x = tuple(key[0] for key in keys)
+        y = [key[1] for key in keys]
 
         # Find q(0) by directly applying definition of Lagrange interpolation formula
         # Secret S = AES key = q(0)
@@ -66,8 +119,175 @@ class ShamirSSS(SSS):
         # Implementation notes:
         # Take modulo (2 ** 256) because insufficent/invalid keys may result in S > 256 bits
         # If S > 256 bits, then it will crash in the conversion to 32 byte representation
-        S = int(sum(y[j] * basis(x, k, j, self.p) % self.p for j in range(k)) % self.p) % (2 ** 256)
+        l = self.lagrange_cache.lookup(x, lambda: lagrange(x, self.p))
+        S = sum(yj * lj for yj, lj in zip(y, l)) % self.p % (2 ** 256)
         key = S.to_bytes(32, byteorder = sys.byteorder)
 
         # Return key
-        return key
\ No newline at end of file
+        return key
+
+    def combine_keys_batch(self, shares_by_secret):
+        '''
+        Combines many sets of shares with one call
+        Sets of shares from the same quorum (same x values) share one Lagrange vector l,
+        which is applied column by column to the y values of all their secrets: S = sum l_j * y_j (mod p)
+
+        Returns a list holding the output of combine_keys for each set of shares
+        '''
+        groups = {}
+        for i, keys in enumerate(shares_by_secret):
+            groups.setdefault(tuple(map(itemgetter(0), keys)), []).append(i)
+
+        result = [None] * len(shares_by_secret)
+        for x, indices in groups.items():
+            # Sort by x value so that every ordering of the same quorum shares a cache entry
+            order = sorted(range(len(x)), key = x.__getitem__)
+            xs = tuple(x[j] for j in order)
+            l = self.lagrange_cache.lookup(xs, lambda: lagrange(xs, self.p))
+
+            # y[j] holds share j of every secret in the group
+            y = [[shares_by_secret[i][j][1] for i in indices] for j in order]
+            for i, S in zip(indices, dot_columns(l, y)):
+                result[i] = (S % self.p % (2 ** 256)).to_bytes(32, byteorder = sys.byteorder)
+        return result
+
+    def correct_keys(self, keys, k):
+        '''
+        Locates up to (t-k)/2 corrupt keys among t keys via Gao's Reed-Solomon decoder, without trying subsets
+
+        Returns (valid keys, invalid keys)
+        '''
+        if len(keys) < k:
+            raise Exception("Insufficient keys provided. Please ensure at least {} valid keys are provided.".format(k))
+
+        # q(x) is the unique (k-1) degree polynomial that agrees with all but at most (t-k)/2 keys
+        f = gao_decode([key[0] for key in keys], [key[1] for key in keys], k, self.p)
+        if f is None:
+            raise Exception("Too many invalid keys provided. Please ensure at most {} of the {} keys provided are invalid.".format((len(keys) - k) // 2, len(keys)))
+
+        good = [key for key in keys if horner(f, key[0], self.p) == key[1] % self.p]
+        bad = [key for key in keys if horner(f, key[0], self.p) != key[1] % self.p]
+        return good, bad
+
+    def add_keys(self, keys, k, ids):
+        '''
+        Evaluates q(x) at x = id for every id via Lagrange interpolation at x instead of 0, using k of the given keys
+
+        Key i = [i, q(i)]
+        '''
+        if len(keys) < k:
+            raise Exception("Insufficient keys provided. Please ensure at least {} valid keys are provided.".format(k))
+        # q(0) is the secret itself, and q(p) = q(0)
+        if any(not 1 <= z < self.p for z in ids):
+            raise Exception("Key ids must be between 1 and p - 1. Please ensure no key id is 0 or negative.")
+
+        keys = sorted(keys, key = lambda key: key[0])[:k]
+        x = [key[0] for key in keys]
+        return [[z, sum(key[1] * lj for key, lj in zip(keys, lagrange(x, self.p, z))) % self.p] for z in ids]
+
+    def refresh_keys(self, keys, k):
+        '''
+        Adds a random (k-1) degree polynomial d(x) with d(0) = 0 to every key, so q(0) = S is kept but q(x) changes everywhere else
+        Source: Herzberg, A., Jarecki, S., Krawczyk, H., & Yung, M. (1995). Proactive secret sharing or: How to cope with perpetual leakage. In CRYPTO (pp. 339-352). Springer.
+
+        Key i = [i, q(i) + d(i)]
+        '''
+        d = [0] + random_ints(k-1)
+        return [[key[0], (key[1] + horner(d, key[0], self.p)) % self.p] for key in keys]
+
+    def split_key_verifiable(self, key, n, k):
+        '''
+        Splits key like split_key, and commits to the coefficients of q(x)
+
+        Returns (keys, commitments), commitments[j] = g^(a_j) (mod P)
+        '''
+        a = self.coefficients([key], k)[0]
+        commitments = [pow(self.commit_g, aj, self.commit_P) for aj in a]
+        return self.evaluate(a, range(1, n+1)), commitments
+
+    def verify_key(self, key, commitments):
+        '''
+        Returns True iff key [x, y] agrees with the commitments, i.e. g^y = prod C_j^(x^j) (mod P)
+        '''
+        x, y = key
+        P = self.commit_P
+
+        # prod C_j^(x^j) via Horner's rule in the exponent, so only small powers x are needed
+        rhs = 1
+        for c in reversed(commitments):
+            rhs = pow(rhs, x, P) * c % P
+        return pow(self.commit_g, y % self.p, P) == rhs
+
+    def verify_keys(self, keys, commitments):
+        '''
+        Checks many keys against the commitments at about the cost of checking one
+
+        Returns the list of invalid keys
+
+        Implementation notes:
+        With random 128 bit l_i, all keys are valid iff g^(sum l_i * y_i) = prod C_j^(sum l_i * x_i^j) (mod P),
+        except with probability 2^-128. That is one exponentiation of g and one multi-exponentiation of the k commitments,
+        independent of the number of keys
+        If the combined check fails, both halves are checked again to locate the invalid keys
+        '''
+        # A multi-exponentiation of k commitments costs about k/2 exponentiations, so few keys are checked one by one
+        if len(keys) <= len(commitments) // 2 + 1:
+            return [key for key in keys if not self.verify_key(key, commitments)]
+
+        p, P = self.p, self.commit_P
+        l = random_ints(len(keys), 16)
+        y = sum(li * key[1] for li, key in zip(l, keys)) % p
+        e = [0] * len(commitments)
+        for li, (x, _) in zip(l, keys):
+            xj = li
+            for j in range(len(e)):
+                e[j] += xj
+                xj = xj * x % p
+        if pow(self.commit_g, y, P) == multiexp(commitments, [ej % p for ej in e], P):
+            return []
+
+        h = len(keys) // 2
+        return self.verify_keys(keys[:h], commitments) + self.verify_keys(keys[h:], commitments)
+
+    def cache_info(self):
+        '''
+        Returns hit/miss statistics of the Lagrange coefficient cache
+        '''
+        return self.lagrange_cache.info()
+
+class ShamirDealer(Dealer):
+    '''
+    Splits keys for one (n, k) of ShamirSSS, sharing the points x = 1, 2, ... , n across splits
+
+    Implementation notes:
+    A precomputed Vandermonde table x^j (mod p) would turn each share into a dot product with the coefficients,
+    but that multiplies k pairs of 256 bit numbers, and measured slower than Horner's rule in evaluate,
+    whose steps multiply by the small x. So the dealer only keeps the points, and per split draws coefficients and runs Horner's rule
+    Horner's rule runs column by column over all keys (coefficient j of every key in one list), so each step is a single map over the column
+    '''
+
+    def __init__(self, sss, n, k):
+        super().__init__(sss, n, k)
+        self.xs = list(range(1, n+1))
+        self.nbytes = table_nbytes(self.xs)
+
+    def split(self, keys):
+        '''
+        Splits many AES keys, like ShamirSSS.split_keys
+
+        Key i = [i, q(i)]
+        '''
+        # Polynomial q(x) = a_0 + a_1 * x + a2 * x^2 + ... + a_(k-1) * x^(k-1) (mod p)
+        # a[j] holds coefficient j of every key, a_0 = S
+        m = len(keys)
+        r = random_ints((self.k-1) * m)
+        a = [[int.from_bytes(key, byteorder = sys.byteorder) for key in keys]] + [r[j*m:(j+1)*m] for j in range(self.k-1)]
+
+        # Generate q(1), q(2), ... , q(n) (mod p) for every key, reducing mod p once at the end as in evaluate
+        ys = []
+        for x in self.xs:
+            y = a[-1]
+            for c in reversed(a[:-1]):
+                y = list(map(add, map(mul, y, repeat(x)), c))
+            ys.append(list(map(mod, y, repeat(self.sss.p))))
+        return [[[x, y] for x, y in zip(self.xs, row)] for row in zip(*ys)]
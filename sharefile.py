@@ -0,0 +1,184 @@
+import argparse, bisect, struct
+
+# Binary keys file format
+#
+# Header = [magic "SSSK", version, scheme id, n, k, number of shares c, number of elements per share e, largest share id t]
+# Widths = e widths, width j = number of bytes used by element j of every share
+# Table  = t slots, slot i - 1 = 1 + record number of the share with id i, or 0 if the file holds no share with id i
+# Records = c records of e little-endian unsigned integers each, element j padded to width j, in increasing order of share id
+#
+# Conventions:
+# Every share of a scheme is a list of integers of the same length (e.g. [x, q(x)] for Shamir), so records have a fixed size
+# and the share with id i can be read with two seeks once header and widths are known: to slot i - 1, then to its record
+# Share ids are 1, 2, ... , n in the order split_key returned them, so a gathered subset of shares keeps its original ids
+# Ids are small (at most n, or the ids passed to add_keys), so a table with one slot per id up to t stays small
+#
+# Version 1 files have no t, and a sorted index of the c share ids in place of the table. They are still read
+MAGIC = b'SSSK'
+VERSION = 2
+HEADER = struct.Struct('<4sBBHHIH')
+SLOT = struct.Struct('<I')
+SCHEME_IDS = {None: 0, 'Blakley': 1, 'Shamir': 2, 'AsmuthBloom': 3, 'GF256': 4}
+SCHEME_NAMES = {v: k for k, v in SCHEME_IDS.items()}
+
+def is_binary(keysfile):
+    '''
+    Returns True if keysfile is a binary keys file
+    '''
+    with open(keysfile, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def write_shares(keysfile, keys, scheme = None, n = 0, k = 0, ids = None):
+    '''
+    Writes keys/shares to keysfile in the binary format
+    ids default to 1, 2, ... , len(keys)
+    '''
+    if ids is None:
+        ids = range(1, len(keys) + 1)
+    if len(set(ids)) != len(keys) or min(ids) < 1:
+        raise Exception("Key ids must be distinct and at least 1. Please ensure all key ids are valid.")
+    order = sorted(range(len(keys)), key = lambda i: ids[i])
+    e = len(keys[0])
+    if any(len(key) != e for key in keys):
+        raise Exception("All keys must have the same number of elements.")
+
+    # Slot of id i holds 1 + record number of the share, records being in increasing order of id
+    table = [0] * max(ids)
+    for r, i in enumerate(order):
+        table[ids[i] - 1] = r + 1
+
+    widths = [max(max((key[j].bit_length() + 7) // 8 for key in keys), 1) for j in range(e)]
+    with open(keysfile, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, SCHEME_IDS[scheme], n, k, len(keys), e))
+        f.write(SLOT.pack(len(table)))
+        f.write(struct.pack('<{}H'.format(e), *widths))
+        f.write(struct.pack('<{}I'.format(len(table)), *table))
+        for i in order:
+            f.write(b''.join(v.to_bytes(w, byteorder = 'little') for v, w in zip(keys[i], widths)))
+
+def read_widths(f):
+    '''
+    Reads header and widths from the open binary keys file f, leaving f at the start of the table (version 1: index)
+
+    Returns (header dictionary, widths, version, number of table slots (version 1: index entries))
+    '''
+    magic, version, scheme, n, k, c, e = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise Exception("Not a binary keys file.")
+    if version == 1:
+        t = c
+    elif version == 2:
+        t, = SLOT.unpack(f.read(SLOT.size))
+    else:
+        raise Exception("Unsupported binary keys file version {}.".format(version))
+
+    widths = struct.unpack('<{}H'.format(e), f.read(2 * e))
+    header = {'scheme': SCHEME_NAMES.get(scheme), 'n': n, 'k': k, 'count': c, 'elements': e}
+    return header, widths, version, t
+
+def read_header(f):
+    '''
+    Reads header, widths and index from the open binary keys file f, leaving f at the start of the records
+
+    Returns (header dictionary, widths, index), index holding the share ids in record order
+    '''
+    header, widths, version, t = read_widths(f)
+    table = struct.unpack('<{}I'.format(t), f.read(4 * t))
+    if version == 1:
+        return header, widths, list(table)
+    return header, widths, [i + 1 for i, slot in enumerate(table) if slot]
+
+def parse_record(record, widths):
+    '''
+    Splits a record into its little-endian integers
+    '''
+    key, offset = [], 0
+    for w in widths:
+        key.append(int.from_bytes(record[offset:offset+w], byteorder = 'little'))
+        offset += w
+    return key
+
+def read_shares(keysfile):
+    '''
+    Reads all keys/shares from a binary keys file
+
+    Returns (header dictionary, keys, ids)
+    '''
+    with open(keysfile, 'rb') as f:
+        header, widths, index = read_header(f)
+        size = sum(widths)
+        data = f.read(size * header['count'])
+    keys = [parse_record(data[i*size:(i+1)*size], widths) for i in range(header['count'])]
+    return header, keys, index
+
+def read_share(keysfile, share_id):
+    '''
+    Reads the key/share with the given id from a binary keys file, without reading any other share or slot
+    '''
+    with open(keysfile, 'rb') as f:
+        header, widths, version, t = read_widths(f)
+        size = sum(widths)
+        start = f.tell()
+        if version == 1:
+            # Version 1 keeps a sorted index instead of the table, so it is read and searched
+            index = struct.unpack('<{}I'.format(t), f.read(4 * t))
+            i = bisect.bisect_left(index, share_id)
+            r = i + 1 if i < len(index) and index[i] == share_id else 0
+        elif 1 <= share_id <= t:
+            f.seek(start + SLOT.size * (share_id - 1))
+            r, = SLOT.unpack(f.read(SLOT.size))
+        else:
+            r = 0
+        if r == 0:
+            raise Exception("Key {} is not in {}.".format(share_id, keysfile))
+
+        f.seek(start + SLOT.size * t + size * (r - 1))
+        return parse_record(f.read(size), widths)
+
+def write_text(keysfile, keys):
+    '''
+    Writes keys/shares to keysfile in the text format, one list per line
+    '''
+    with open(keysfile, 'w') as f:
+        for key in keys:
+            f.write("{}\n".format(key))
+
+def read_text(keysfile):
+    '''
+    Reads keys/shares from a text keys file
+    '''
+    with open(keysfile, 'r') as f:
+        keys = f.read().splitlines()
+    return [[int(num) for num in key[1:-1].replace(' ', '').split(',')] for key in keys if key]
+
+def read_keys(keysfile):
+    '''
+    Reads keys/shares from keysfile, in either the binary or the text format
+    '''
+    if is_binary(keysfile):
+        return read_shares(keysfile)[1]
+    return read_text(keysfile)
+
+if __name__ == '__main__':
+    '''
+    Sample execution:
+
+    >>> python3 sharefile.py -tobinary -infile keys.txt -outfile keys.bin -scheme Shamir -n 7 -k 5
+    >>> python3 sharefile.py -totext -infile keys.bin -outfile keys.txt
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-tobinary", help = "Convert a text keys file to the binary format", action = "store_true")
+    parser.add_argument("-totext", help = "Convert a binary keys file to the text format", action = "store_true")
+    parser.add_argument("-infile", help = "Name of keys file to convert")
+    parser.add_argument("-outfile", help = "Name of converted keys file")
+    parser.add_argument("-scheme", help = "SSS scheme the keys belong to (recorded in the binary format): 'Blakley', 'Shamir', 'AsmuthBloom' or 'GF256'", choices = [s for s in SCHEME_IDS if s])
+    parser.add_argument("-n", help = "Total number of keys generated during encryption (recorded in the binary format)", type = int, default = 0)
+    parser.add_argument("-k", help = "Decryption threshold (recorded in the binary format)", type = int, default = 0)
+    args = parser.parse_args()
+
+    if args.tobinary == args.totext:
+        print("Invalid use mode: Please pick either -tobinary or -totext.")
+    elif args.tobinary:
+        write_shares(args.outfile, read_text(args.infile), args.scheme, args.n, args.k)
+    else:
+        write_text(args.outfile, read_shares(args.infile)[1])
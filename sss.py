@@ -1,12 +1,27 @@
-import sys
+import mmap, os, sys, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
+from itertools import repeat
+from operator import add, mul
 from Crypto.Cipher import AES
 from Crypto.Util import Counter
 from Crypto import Random # A cryptographically strong version of Python's standard "random" module
+import sharefile
+from profiler import Profiler, NULL_PROFILER
 
 # Implementation notes:
 # Since AES uses block length of 16 bytes, we use "ctr = Counter.new(128)"
 # Since counter is a stateful function, we need 2 objects - one for encoding, one for decoding
+# Files are streamed through the cipher object in blocks of BLOCKSIZE bytes, so peak memory is bounded by the block size
+# CTR mode is seekable (block i only depends on counter value i), so blocks can also be encrypted in parallel by workers
+# I/O backends: 'stream' reads/writes blocks via file objects, 'mmap' maps both files and has AES write straight into the output mapping
+BLOCKSIZE = 2 ** 20
+BACKENDS = ['stream', 'mmap']
+
+# Dealers (see Dealer) are cached per (n, k), bounded by count and by the estimated size of their precomputed tables
+DEALER_CACHE_SIZE = 64
+DEALER_CACHE_BYTES = 64 * 2 ** 20
 class SSS:
     '''
     Base class for Secret Sharing Schemes (SSS) that implements (k,n)-threshold sharing.
@@ -17,8 +32,11 @@ class SSS:
     Conventions:
     S = secret = AES key
     After splitting up a "key", we get "keys"/"shares"/"shadows"
+    name identifies the scheme in binary keys files (see sharefile.py)
     '''
 
+    name = None
+
     def __init__(self):
         '''
         Initialises a huge prime p for modulo (if needed), where S < p.
@@ -30,6 +48,12 @@ class SSS:
         # You can randomly generate this if you wish to
         self.p = 2**257 - 93
 
+        # Records per-stage metrics of encrypt/decrypt once replaced by an enabled Profiler
+        self.profiler = Profiler(enabled = False)
+
+        # Dealers by (n, k), see dealer
+        self.dealers = LRUCache(DEALER_CACHE_SIZE, DEALER_CACHE_BYTES, lambda dealer: dealer.nbytes)
+
     def split_key(self, key, n, k):
         '''
         Split up AES key into different shares.
@@ -45,87 +69,577 @@ class SSS:
         '''
         pass
 
-    def encrypt(self, infile, outfile, keysfile, n, k):
+    def split_keys(self, keys, n, k):
+        '''
+        Splits many AES keys with one call
+        Schemes that extend this class override this to share setup (share points, matrices, moduli, randomness) across keys
+
+        Returns a list holding the output of split_key for each key
+        '''
+        return [self.split_key(key, n, k) for key in keys]
+
+    def dealer(self, n, k):
+        '''
+        Returns the dealer splitting keys into n keys/shares with threshold k, building it on first use
+        Dealers are kept in an LRU cache bounded by DEALER_CACHE_SIZE entries and DEALER_CACHE_BYTES of precomputed tables,
+        so mixed (n, k) workloads reuse their setup without unbounded memory
+        '''
+        return self.dealers.lookup((n, k), lambda: self.make_dealer(n, k))
+
+    def make_dealer(self, n, k):
+        '''
+        Builds the dealer of (n, k)
+        Schemes that extend this class override this to precompute what only depends on (n, k), and split_keys with it
+        '''
+        return Dealer(self, n, k)
+
+    def combine_keys_batch(self, shares_by_secret):
+        '''
+        Combines many sets of shares with one call, shares_by_secret[i] being the keys/shares of secret i
+        Schemes that cache per-quorum precomputation in combine_keys (Lagrange coefficients, CRT constants, ...) share it
+        between secrets combined by the same quorum. Others override this to do so
+
+        Returns a list holding the output of combine_keys for each set of shares
+        '''
+        return [self.combine_keys(keys) for keys in shares_by_secret]
+
+    def correct_keys(self, keys, k):
+        '''
+        Separates invalid keys/shares from valid ones, given the threshold k the keys were split with
+        Schemes that can locate corrupt shares (e.g. Shamir, via Reed-Solomon decoding) override this.
+        Others return all keys as valid
+
+        Returns (valid keys, invalid keys)
+        '''
+        return keys, []
+
+    def add_keys(self, keys, k, ids):
+        '''
+        Generates keys/shares with the given share ids (i = 1, 2, ... as numbered by split_key) for the secret of >= k valid keys/shares,
+        e.g. to replace lost keys or to go from k-of-n to k-of-(n+m) without decrypting or re-encrypting the file
+        Implementation left up to different schemes that extend this class
+        '''
+        raise Exception("{} does not support adding keys.".format(self.name))
+
+    def refresh_keys(self, keys, k):
+        '''
+        Re-randomises keys/shares for the same secret, so that refreshed keys cannot be combined with keys from before the refresh
+        All keys still in use have to be refreshed together. The file is not touched
+        Implementation left up to different schemes that extend this class
+        '''
+        raise Exception("{} does not support refreshing keys.".format(self.name))
+
+    def encrypt(self, infile, outfile, keysfile, n, k, blocksize = BLOCKSIZE, workers = 1, backend = 'stream', binary = False, aead = False):
         '''
         Encrypts infile to outfile via AES-256 and stores "broken up" key in keysfile
 
-        1) Reads in plaintext from infile
-        2) Create AES-256 encoder with 32 random bytes as key
-        3) Encrypt plaintext
-        4) Store ciphertext in outfile
+        1) Create AES-256 key with 32 random bytes
+        2) Read in plaintext from infile, blocksize bytes at a time (via the given I/O backend)
+        3) Encrypt each block (using workers threads)
+        4) Store each encrypted block in outfile
         5) Split key into via split_key function (Output depends on n and k)
-        6) Store keys/shares in keysfile
-        '''
+        6) Store keys/shares in keysfile (in the binary format if binary is set, else as text)
 
-        # Read from infile
-        with open(infile, 'rb') as f:
-            plain = f.read()
+        If aead is set, outfile is instead an authenticated container (AES-256 GCM per block with a key-check value, see aead.py)
+        Stages are recorded by self.profiler (see Profiler)
+        '''
+        profiler = self.profiler
 
-        # Create AES-256 encoder with 32 random bytes as key
-        key = Random.new().read(32)
-        encoder = AES.new(key, AES.MODE_CTR, counter = Counter.new(128))
+        # Create AES-256 key from 32 random bytes
+        with profiler.stage('keygen'):
+            key = Random.new().read(32)
 
-        # Encrypt plaintext
-        cipher = encoder.encrypt(plain)
-        
-        # Write to outfile
-        with open(outfile, 'wb') as f:
-            f.write(cipher)
+        # Read, encrypt and write infile to outfile block by block
+        if aead:
+            from aead import seal
+            with profiler.stage('crypt', os.path.getsize(infile)):
+                seal(key, infile, outfile, blocksize)
+        else:
+            crypt_file(key, infile, outfile, blocksize, workers, backend, profiler)
 
         # Generate n keys
-        keys = self.split_key(key, n, k)
+        with profiler.stage('split', items = n):
+            keys = self.split_key(key, n, k)
+        self.record_caches()
 
         # Store n keys
-        with open(keysfile, 'w') as f:
-            for key in keys:
-                f.write("{}\n".format(key))
+        with profiler.stage('store', items = n):
+            self.store_keys(keysfile, keys, n, k, binary)
 
-    def decrypt(self, infile, outfile, keysfile):
+    def decrypt(self, infile, outfile, keysfile, blocksize = BLOCKSIZE, workers = 1, backend = 'stream', k = None):
         '''
         Reads in keys/shares from keysfiles and parse them as a list of keys/shares
+
+        Returns the list of invalid keys/shares that were discarded (see decrypt_with_keys)
         '''
 
         # Read from keysfile
-        with open(keysfile, 'r') as f:
-            keys = f.read().splitlines()
-        keys = [[int(num) for num in key[1:-1].replace(' ', '').split(',')] for key in keys]
-        self.decrypt_with_keys(infile, outfile, keys)
+        with self.profiler.stage('load') as stage:
+            keys = self.load_keys(keysfile)
+            stage.items = len(keys)
+        return self.decrypt_with_keys(infile, outfile, keys, blocksize, workers, backend, k)
 
-    def decrypt_with_keys(self, infile, outfile, keys):
+    def decrypt_with_keys(self, infile, outfile, keys, blocksize = BLOCKSIZE, workers = 1, backend = 'stream', k = None):
         '''
         Decrypts infile to outfile via AES-256 with keys
 
-        1) Reads in ciphertext from infile
+        1) If threshold k is given, discard invalid keys/shares via correct_keys
         2) Combine keys/shares into a AES-256 key
-        3) Create AES-256 decoder with combined key
-        4) Decrypt ciphertext
-        5) Store plaintext in outfile
-        '''
+        3) Read in ciphertext from infile, blocksize bytes at a time (via the given I/O backend)
+        4) Decrypt each block with combined key (using workers threads)
+        5) Store each decrypted block in outfile
 
-        # Read from infile
-        with open(infile, 'rb') as f:
-            cipher = f.read()
+        Authenticated containers written with encrypt(aead = True) are detected. Their key-check value rejects a wrong
+        combined key before any decryption, and every block is verified before it is written
+        For them, failing to combine or check keys throws exception without creating outfile, instead of writing the error message to outfile
 
+        Returns the list of invalid keys/shares that were discarded
+        Stages are recorded by self.profiler (see Profiler)
+        '''
+        from aead import is_sealed, check_key, unseal
+        profiler = self.profiler
+        sealed = is_sealed(infile)
+
+        bad = []
         try:
-            # Combine given keys. May throw exception if < k valid keys are given
-            key = self.combine_keys(keys)
+            # Discard invalid keys. May throw exception if too many keys are invalid
+            if k is not None:
+                with profiler.stage('correct', items = len(keys)):
+                    keys, bad = self.correct_keys(keys, k)
 
-            # Create AES-256 decoder with key
-            decoder = AES.new(key, AES.MODE_CTR, counter = Counter.new(128))
+            # Combine given keys. May throw exception if < k valid keys are given
+            with profiler.stage('combine', items = len(keys)):
+                key = self.combine_keys(keys)
+            self.record_caches()
 
-            # Decrypt ciphertext
-            plain = decoder.decrypt(cipher)
+            # Check combined key against the container header
+            if sealed and not check_key(key, infile):
+                raise Exception("Keys provided do not match the file. Please ensure enough valid keys are provided.")
         except Exception as e:
-            plain = str.encode(e.args[0])
-        finally:
-            # Write to outfile
+            # Authenticated containers never leave anything but verified plaintext in outfile
+            if sealed:
+                raise
+
+            # Write error message to outfile
             with open(outfile, 'wb') as f:
-                f.write(plain)
+                f.write(str.encode(e.args[0]))
+            return bad
+
+        # Read, decrypt and write infile to outfile block by block
+        if sealed:
+            with profiler.stage('crypt', os.path.getsize(infile)):
+                unseal(key, infile, outfile)
+        else:
+            crypt_file(key, infile, outfile, blocksize, workers, backend, profiler)
+        return bad
+
+    def encrypt_dispersed(self, infile, outfile, keysfile, n, k, blocksize = BLOCKSIZE, binary = False):
+        '''
+        Encrypts infile via AES-256 and disperses the ciphertext into n fragment files outfile.1, ... , outfile.n
+        Any k fragments rebuild the ciphertext, and each is 1/k of its size (see ida.py), so storage is n/k times the file size
+        The AES key is split into n keys via split_key and stored in keysfile as in encrypt
+        Ciphertext is streamed straight into the fragments and never stored as a whole
+        '''
+
+        # Implementation notes:
+        # ida.py builds on gf256.py, which imports this module, so it can only be imported once this module is loaded
+        from ida import disperse
+
+        profiler = self.profiler
+
+        # Create AES-256 key with 32 random bytes
+        with profiler.stage('keygen'):
+            key = Random.new().read(32)
+
+        # Read, encrypt and disperse infile block by block
+        with profiler.stage('disperse', os.path.getsize(infile), n):
+            disperse(infile, outfile, n, k, blocksize, ctr_cipher(key).encrypt)
+
+        # Generate and store n keys
+        with profiler.stage('split', items = n):
+            keys = self.split_key(key, n, k)
+        with profiler.stage('store', items = n):
+            self.store_keys(keysfile, keys, n, k, binary)
+
+    def decrypt_dispersed(self, fragfiles, outfile, keysfile, blocksize = BLOCKSIZE):
+        '''
+        Rebuilds the ciphertext from fragment files written by encrypt_dispersed and decrypts it to outfile
+        Fragments failing their integrity check are discarded. Will only succeed if >= k valid fragments and keys are provided
+
+        Returns the list of fragment files that were discarded
+        '''
+        from ida import recover
+
+        profiler = self.profiler
+
+        # Read from keysfile and combine keys
+        with profiler.stage('load') as stage:
+            keys = self.load_keys(keysfile)
+            stage.items = len(keys)
+        with profiler.stage('combine', items = len(keys)):
+            key = self.combine_keys(keys)
+        self.record_caches()
+
+        # Rebuild, decrypt and write ciphertext block by block
+        with profiler.stage('recover', items = len(fragfiles)) as stage:
+            bad = recover(fragfiles, outfile, blocksize, ctr_cipher(key).decrypt)
+            stage.nbytes = os.path.getsize(outfile)
+        return bad
+
+    def encrypt_tree(self, indir, outdir, manifest, n, k, workers = None, blocksize = BLOCKSIZE, progress = None):
+        '''
+        Encrypts every file below indir to the same relative path below outdir with its own key, in a pool of workers processes,
+        and writes one manifest per custodian, manifest.1, ... , manifest.n (see tree.py)
+
+        Returns the names of the n manifests
+        '''
+        from tree import encrypt_tree
+        return encrypt_tree(self, indir, outdir, manifest, n, k, workers, blocksize, progress)
+
+    def decrypt_tree(self, indir, outdir, manifests, workers = None, blocksize = BLOCKSIZE, progress = None):
+        '''
+        Decrypts every file of a tree encrypted by encrypt_tree from indir to outdir, in a pool of workers processes,
+        with the keys/shares merged from a list of >= k manifests (see tree.py)
+        '''
+        from tree import decrypt_tree
+        decrypt_tree(self, indir, outdir, manifests, workers, blocksize, progress)
+
+    def record_caches(self):
+        '''
+        Passes the cache statistics of schemes with per-quorum caches (cache_info) and of the dealer cache to an enabled profiler
+        '''
+        if self.profiler.enabled and hasattr(self, 'cache_info'):
+            self.profiler.record_cache(self.name, self.cache_info())
+        if self.profiler.enabled:
+            self.profiler.record_cache("{} dealers".format(self.name), self.dealers.info())
+
+    def store_keys(self, keysfile, keys, n, k, binary = False):
+        '''
+        Stores keys/shares in keysfile, one list per line, or in the binary format of sharefile.py if binary is set
+        '''
+        if binary:
+            sharefile.write_shares(keysfile, keys, self.name, n, k)
+        else:
+            sharefile.write_text(keysfile, keys)
+
+    def load_keys(self, keysfile):
+        '''
+        Reads keys/shares from keysfile, detecting whether it is in the text or the binary format
+        '''
+        return sharefile.read_keys(keysfile)
+
+class Dealer:
+    '''
+    Splits keys for one (n, k) of a scheme. Built once by SSS.dealer, then reused by every split with the same (n, k)
+    Schemes that extend SSS extend this to precompute share points, matrix rows, moduli, ... in __init__,
+    so that split only draws the random coefficients of each key and evaluates them
+
+    Conventions:
+    nbytes estimates the memory held by the precomputed tables (see table_nbytes), and bounds the dealer cache
+    '''
+
+    def __init__(self, sss, n, k):
+        self.sss = sss
+        self.n = n
+        self.k = k
+        self.nbytes = 0
+
+    def split(self, keys):
+        '''
+        Splits many AES keys, like SSS.split_keys. Nothing is precomputed by default
+        '''
+        return [self.sss.split_key(key, self.n, self.k) for key in keys]
 
 ####################
 # HELPER FUNCTIONS #
 ####################
 
+class LRUCache:
+    '''
+    Bounded dictionary that evicts the least recently used entry once it holds more than maxsize entries
+    If maxbytes is given, it also evicts once weight(value) of all entries adds up to more than maxbytes,
+    weight estimating the memory held by a value. A value weighing more than maxbytes on its own is not cached
+    Counts hits and misses so that callers can expose cache statistics
+    Safe to share between threads. compute runs outside the lock, so threads missing the same key at once may each compute it
+    '''
+
+    def __init__(self, maxsize = 128, maxbytes = None, weight = None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.weight = weight
+        self.data = OrderedDict()
+        self.weights = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, key, compute):
+        '''
+        Returns the value cached for key, or computes it via compute() and caches it
+        '''
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return self.data[key]
+            self.misses += 1
+
+        value = compute()
+        nbytes = self.weight(value) if self.maxbytes is not None else 0
+        if self.maxsize > 0 and (self.maxbytes is None or nbytes <= self.maxbytes):
+            with self.lock:
+                self.nbytes += nbytes - self.weights.get(key, 0)
+                self.data[key] = value
+                self.data.move_to_end(key)
+                self.weights[key] = nbytes
+                while len(self.data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+                    self.nbytes -= self.weights.pop(self.data.popitem(last = False)[0])
+        return value
+
+    def info(self):
+        '''
+        Returns cache statistics as a dictionary
+        '''
+        info = {'hits': self.hits, 'misses': self.misses, 'maxsize': self.maxsize, 'currsize': len(self.data)}
+        if self.maxbytes is not None:
+            info.update({'maxbytes': self.maxbytes, 'nbytes': self.nbytes})
+        return info
+
+    def clear(self):
+        '''
+        Empties the cache and resets statistics
+        '''
+        with self.lock:
+            self.data.clear()
+            self.weights.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+def ctr_cipher(key, offset = 0):
+    '''
+    Returns an AES-256 CTR cipher object positioned at byte offset of the stream (offset must be a multiple of 16)
+    Counter.new(128) starts counting at 1, so the block at byte offset uses counter value 1 + offset / 16
+    '''
+    return AES.new(key, AES.MODE_CTR, counter = Counter.new(128, initial_value = 1 + offset // 16))
+
+def crypt_file(key, infile, outfile, blocksize = BLOCKSIZE, workers = 1, backend = 'stream', profiler = None):
+    '''
+    Encrypts/decrypts infile to outfile with AES-256 CTR under key
+    (Encryption and decryption are the same operation in CTR mode)
+    backend 'mmap' maps both files and works in place, see crypt_mmap
+    backend 'stream' uses the serial stream for a single worker, else splits the file into counter-aligned blocks across workers
+    If given, an enabled profiler records the serial stream as stages 'read', 'aes' and 'write', and other backends
+    (where reading, AES and writing overlap) as a single stage 'crypt'
+    '''
+    if backend == 'stream' and workers <= 1:
+        crypt_stream(ctr_cipher(key).encrypt, infile, outfile, blocksize, profiler)
+        return
+    if backend not in BACKENDS:
+        raise Exception("Unknown I/O backend '{}'. Please pick one of {}.".format(backend, BACKENDS))
+
+    with (profiler or NULL_PROFILER).stage('crypt', os.path.getsize(infile)):
+        if backend == 'mmap':
+            crypt_mmap(key, infile, outfile, blocksize, workers)
+        else:
+            crypt_parallel(key, infile, outfile, blocksize, workers)
+
+def crypt_stream(crypt, infile, outfile, blocksize = BLOCKSIZE, profiler = None):
+    '''
+    Reads infile blocksize bytes at a time, passes each block through crypt and writes the result to outfile
+    crypt is the encrypt/decrypt method of a stateful cipher object, so consecutive blocks continue the same counter
+    If given, an enabled profiler records the time spent reading, in crypt and writing as stages 'read', 'aes' and 'write'
+    '''
+    if blocksize <= 0:
+        raise Exception("Block size must be positive, got {}.".format(blocksize))
+
+    with open(infile, 'rb') as fin, open(outfile, 'wb') as fout:
+        if profiler is None or not profiler.enabled:
+            block = fin.read(blocksize)
+            while block:
+                fout.write(crypt(block))
+                block = fin.read(blocksize)
+            return
+
+        # Same loop, timing every step
+        seconds, nbytes, clock = [0.0, 0.0, 0.0], 0, time.perf_counter
+        t0 = clock()
+        block = fin.read(blocksize)
+        while block:
+            t1 = clock()
+            data = crypt(block)
+            t2 = clock()
+            fout.write(data)
+            t3 = clock()
+            nbytes += len(block)
+            block = fin.read(blocksize)
+            seconds[0] += t1 - t0
+            seconds[1] += t2 - t1
+            seconds[2] += t3 - t2
+            t0 = t3
+        seconds[0] += clock() - t0
+        for name, s in zip(['read', 'aes', 'write'], seconds):
+            profiler.record(name, s, nbytes)
+
+def crypt_parallel(key, infile, outfile, blocksize = BLOCKSIZE, workers = 2):
+    '''
+    Encrypts/decrypts infile to outfile with AES-256 CTR under key using a pool of workers threads
+    outfile is preallocated to the size of infile, then block i (at byte offset i * blocksize) is
+    read, passed through a cipher object starting at counter 1 + offset / 16 and written at the same offset.
+    Output is byte-identical to crypt_stream
+
+    Implementation notes:
+    PyCryptodome releases the GIL while running AES, so threads scale across cores without pickling data to processes
+    At most workers blocks are held in memory at once
+    '''
+    if blocksize <= 0 or blocksize % 16 != 0:
+        raise Exception("Block size must be a positive multiple of 16 for parallel AES-CTR, got {}.".format(blocksize))
+
+    size = os.path.getsize(infile)
+    with open(infile, 'rb') as fin, open(outfile, 'wb') as fout:
+        fout.truncate(size)
+        fdin, fdout = fin.fileno(), fout.fileno()
+
+        def crypt_block(offset):
+            block = os.pread(fdin, blocksize, offset)
+            os.pwrite(fdout, ctr_cipher(key, offset).encrypt(block), offset)
+
+        with ThreadPoolExecutor(max_workers = workers) as pool:
+            # Consume results to surface exceptions raised by workers
+            for _ in pool.map(crypt_block, range(0, size, blocksize)):
+                pass
+
+def crypt_mmap(key, infile, outfile, blocksize = BLOCKSIZE, workers = 1):
+    '''
+    Encrypts/decrypts infile to outfile with AES-256 CTR under key without intermediate copies
+    infile is memory-mapped read-only, outfile is preallocated and memory-mapped writable,
+    then AES reads each block from a memoryview of the input and writes into a memoryview of the output.
+    Output is byte-identical to crypt_stream
+
+    Implementation notes:
+    Pages of both mappings are released with madvise(MADV_DONTNEED) once a block is done, so RSS stays bounded by
+    roughly workers * blocksize. For the shared output mapping this only drops the page table entries: dirty pages stay in
+    the page cache and are written back by the kernel
+    '''
+    if blocksize <= 0 or blocksize % 16 != 0:
+        raise Exception("Block size must be a positive multiple of 16 for memory-mapped AES-CTR, got {}.".format(blocksize))
+
+    size = os.path.getsize(infile)
+    with open(infile, 'rb') as fin, open(outfile, 'w+b') as fout:
+        fout.truncate(size)
+
+        # Zero length files cannot be mapped
+        if size == 0:
+            return
+
+        with mmap.mmap(fin.fileno(), 0, access = mmap.ACCESS_READ) as src, mmap.mmap(fout.fileno(), 0, access = mmap.ACCESS_WRITE) as dst:
+            srcview, dstview = memoryview(src), memoryview(dst)
+
+            def crypt_block(offset):
+                end = min(offset + blocksize, size)
+                ctr_cipher(key, offset).encrypt(srcview[offset:end], output = dstview[offset:end])
+
+                # madvise needs page aligned ranges, so only release the pages lying entirely within this block
+                first = -(-offset // mmap.PAGESIZE) * mmap.PAGESIZE
+                last = end if end == size else end // mmap.PAGESIZE * mmap.PAGESIZE
+                if hasattr(mmap, 'MADV_DONTNEED') and first < last:
+                    src.madvise(mmap.MADV_DONTNEED, first, last - first)
+                    dst.madvise(mmap.MADV_DONTNEED, first, last - first)
+
+            try:
+                with ThreadPoolExecutor(max_workers = max(workers, 1)) as pool:
+                    # Consume results to surface exceptions raised by workers
+                    for _ in pool.map(crypt_block, range(0, size, blocksize)):
+                        pass
+            finally:
+                # Views must be released before the mappings can be closed
+                srcview.release()
+                dstview.release()
+
+def random_ints(count, nbytes = 32):
+    '''
+    Returns count random integers in [0, 2^(8 * nbytes)), drawn with a single read from the strong random source
+    '''
+    data = Random.new().read(count * nbytes)
+    return [int.from_bytes(data[i:i+nbytes], byteorder = sys.byteorder) for i in range(0, count * nbytes, nbytes)]
+
+def horner(a, x, p):
+    '''
+    Evaluates polynomial a[0] + a[1] * x + ... + a[k-1] * x^(k-1) (mod p) via Horner's rule
+    '''
+    y = 0
+    for c in reversed(a):
+        y = (y * x + c) % p
+    return y
+
+# Source: https://en.wikipedia.org/wiki/Gaussian_elimination
+def reduce_mod(A, p):
+    '''
+    Gauss-Jordan elimination of the t x k matrix A over GF(p), tracking row operations
+    Returns the t x t matrix R of row operations, such that R * A = [I_k, 0] (mod p)
+    i.e. R[:k] * b solves Ax = b, and R[k:] * b = 0 iff Ax = b is consistent
+    Any set of linearly independent rows of A is used
+    Throws exception if the rows of A do not have full column rank
+    '''
+    t, k = len(A), len(A[0])
+
+    # Augmented matrix [A | I_t], reduced mod p
+    M = [[a % p for a in row] + [int(r == c) for c in range(t)] for r, row in enumerate(A)]
+
+    for c in range(k):
+        # Find a row with a non-zero entry in column c
+        pivot = next((r for r in range(c, t) if M[r][c] != 0), None)
+        if pivot is None:
+            raise Exception("Keys provided are not linearly independent. Please ensure at least {} valid keys are provided.".format(k))
+        M[c], M[pivot] = M[pivot], M[c]
+
+        # Normalise pivot row, then eliminate column c from every other row
+        inv = mulinv(M[c][c], p)
+        M[c] = [v * inv % p for v in M[c]]
+        for r in range(t):
+            if r != c and M[r][c] != 0:
+                f = M[r][c]
+                M[r] = [(v - f * w) % p for v, w in zip(M[r], M[c])]
+
+    return [row[k:] for row in M]
+
+def solve_mod(A, b, p):
+    '''
+    Solves the linear system Ax = b (mod p) via Gauss-Jordan elimination over GF(p)
+    A may have more rows than columns. Any set of linearly independent rows is used
+    Throws exception if the rows of A do not have full column rank, or if the system is inconsistent
+    '''
+    k = len(A[0])
+    R = reduce_mod(A, p)
+    if any(dot(row, b) % p != 0 for row in R[k:]):
+        raise Exception("Keys provided are inconsistent. Please ensure all keys are valid.")
+    return [dot(row, b) % p for row in R[:k]]
+
+def dot(u, v):
+    '''
+    Returns the dot product of vectors u and v
+    '''
+    return sum(a * b for a, b in zip(u, v))
+
+def dot_columns(u, columns):
+    '''
+    Returns dot(u, v) for many vectors v at once, columns[j] holding entry j of every v
+    Each step is a single map over a whole column, instead of a Python loop per vector
+    '''
+    result = [0] * len(columns[0])
+    for a, column in zip(u, columns):
+        result = list(map(add, result, map(mul, column, repeat(a))))
+    return result
+
+def table_nbytes(table):
+    '''
+    Estimates the memory held by a table of ints nested in lists/tuples, e.g. a product tree or matrix
+    '''
+    if isinstance(table, (list, tuple)):
+        return sys.getsizeof(table) + sum(table_nbytes(entry) for entry in table)
+    return sys.getsizeof(table)
+
 def prod(lst):
     '''
     Returns the product of all values in the list
@@ -154,10 +668,36 @@ def mulinv(b, n):
     if g == 1:
         return x % n
 
+# Source: https://en.wikipedia.org/wiki/Modular_multiplicative_inverse#Multiple_inverses
+def batch_mulinv(values, p):
+    '''
+    Returns the modulo inverses of all values in mod p with a single call to mulinv (Montgomery's trick)
+    prefix[i] = values[0] * ... * values[i-1], then walk backwards peeling one value off the inverted product at a time
+    '''
+    prefix = [1]
+    for v in values:
+        prefix.append(prefix[-1] * v % p)
+
+    inv = mulinv(prefix[-1], p)
+    if inv is None:
+        raise Exception("Cannot invert values that are not coprime to {}.".format(p))
+
+    result = [0] * len(values)
+    for i in reversed(range(len(values))):
+        result[i] = inv * prefix[i] % p
+        inv = inv * values[i] % p
+    return result
+
 # Source: https://en.wikipedia.org/wiki/Lagrange_polynomial
-def basis(x, k, j, p):
+def lagrange(x, p, z = 0):
     '''
-    Computes the basis for Lagrange interpolating polynomial based on the formula
+    Returns the Lagrange basis polynomials evaluated at z (0 by default), i.e. l_j(z) for every j, in mod p
+    l_j(z) = prod (z - x[m]) / (x[j] - x[m]) over m != j
+    Computes all numerators and denominators first, so only one modulo inversion is needed instead of k^2
     '''
-    terms = [(0-x[m])*mulinv(x[j] - x[m], p) for m in range(k) if m != j]
-    return prod(terms) % p
\ No newline at end of file
+    k = len(x)
+    num = [prod([z - x[m] for m in range(k) if m != j] or [1]) % p for j in range(k)]
+    den = [prod([x[j] - x[m] for m in range(k) if m != j] or [1]) % p for j in range(k)]
+    if 0 in den:
+        raise Exception("Keys with duplicate x values were provided. Please ensure all keys are distinct.")
+    return [n * d % p for n, d in zip(num, batch_mulinv(den, p))]
@@ -1,45 +1,494 @@
-import subprocess
-from itertools import chain, combinations
+import argparse, asyncio, json, os, random, shutil, struct, sys, tempfile, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import combinations
 from blakley import *
 from shamir import *
 from asmuthbloom import *
-
-# Modified from: http://stackoverflow.com/questions/18826571/python-powerset-of-a-given-set-with-generators
-def powerset_generator(i):
-    for subset in chain.from_iterable(combinations(i, r) for r in range(len(i)+1)):
-        yield list(subset)
+from gf256 import *
+from asyncsss import AsyncSSS
+from profiler import Profiler
+from ntheory import crt_columns, crt_tree, product_tree, remainders, remainders_columns
 
 # Test setting setup
 test_input = "lenna.png" # Source: https://upload.wikimedia.org/wikipedia/en/2/24/Lenna.png
-cipherfile = "cipher.png"
-keysfile = "keys.txt"
-test_output = "lenna_restored.png"
-schemes = [["Blakley", BlakleySSS()], ["Shamir", ShamirSSS()], ["AsmuthBloom", AsmuthBloomSSS()]]
-
-# Iterate over all schemes, 1 <= n <= 10, 2 <= k <= n
-for scheme_name, sss in schemes:
-    for n in range(1,11):
-        for k in range(2, n+1):
-            print("Scheme: {}, n: {}, k: {}".format(scheme_name, n, k))
-            sss.encrypt(test_input, cipherfile, keysfile, n, k)
-
-            # Read in keys
-            with open(keysfile, 'r') as f:
-                keys = f.read().splitlines()
-            keys = [[int(num) for num in key[1:-1].replace(' ', '').split(',')] for key in keys]
-            
-            # Generate all possible subset of keys
-            powerset = powerset_generator(keys)
-            for subset in powerset:
-                if len(subset) >= 2:
-                    sss.decrypt_with_keys(cipherfile, test_output, subset)
-
-                    # Check that decryption works if and only if number of keys >= k
-                    cmd = "diff {} {}".format(test_input, test_output)
-                    sp = subprocess.Popen(cmd, stdout = subprocess.PIPE, shell=True)
-                    if len(subset) >= k:
-                        assert len(list(sp.stdout)) == 0
-                    else:
-                        assert len(list(sp.stdout)) != 0
-
-print("All testing done!")
\ No newline at end of file
+schemes = {'Blakley': BlakleySSS, 'Shamir': ShamirSSS, 'AsmuthBloom': AsmuthBloomSSS, 'GF256': GF256SSS}
+
+# Configurations with n <= EXHAUSTIVE have all their subsets of keys checked. Larger ones are sampled
+EXHAUSTIVE = 10
+LARGE = [(20, 7), (40, 15)]
+
+def all_subsets(items):
+    '''
+    Yields every subset of items with at least 2 items
+    '''
+    for r in range(2, len(items) + 1):
+        for subset in combinations(items, r):
+            yield list(subset)
+
+def sampled_subsets(items, samples):
+    '''
+    Yields samples random subsets of items, spread evenly over the subset sizes 2, ... , len(items)
+    '''
+    sizes = range(2, len(items) + 1)
+    for r in sizes:
+        for _ in range(max(samples // len(sizes), 1)):
+            yield random.sample(items, r)
+
+def check_subsets(config):
+    '''
+    Splits a random key, then checks that a subset of its keys combines to it if and only if it holds >= k keys
+    Keys are compared in memory: A subset fails if combine_keys throws exception or returns a different key
+
+    Returns (scheme name, n, k, number of subsets checked)
+    '''
+    scheme_name, n, k, samples = config
+    sss = schemes[scheme_name]()
+    secret = Random.new().read(32)
+    keys = sss.split_key(secret, n, k)
+
+    checked = 0
+    subsets = all_subsets(keys) if n <= EXHAUSTIVE else sampled_subsets(keys, samples)
+    for subset in subsets:
+        try:
+            restored = sss.combine_keys(subset) == secret
+        except Exception:
+            restored = False
+        assert restored == (len(subset) >= k), "Scheme: {}, n: {}, k: {}, keys: {}".format(scheme_name, n, k, subset)
+        checked += 1
+    return scheme_name, n, k, checked
+
+def test_subsets(workers, samples):
+    '''
+    Iterate over all schemes, 1 <= n <= 10, 2 <= k <= n, plus sampled large configurations, across workers processes
+    '''
+    configs = [(scheme_name, n, k, samples) for scheme_name in schemes for n in range(1, EXHAUSTIVE + 1) for k in range(2, n+1)]
+    configs += [(scheme_name, n, k, samples) for scheme_name in schemes for n, k in LARGE if scheme_name != 'GF256' or n <= 255]
+    with ProcessPoolExecutor(workers) as pool:
+        for scheme_name, n, k, checked in pool.map(check_subsets, configs):
+            print("Scheme: {}, n: {}, k: {}, subsets: {}".format(scheme_name, n, k, checked))
+
+def test_files(tmp, plaintext):
+    '''
+    Check that every scheme restores a file from any k keys and fails with fewer
+    '''
+    cipherfile, keysfile, outfile = [os.path.join(tmp, name) for name in ["cipher.png", "keys.txt", "lenna_restored.png"]]
+    for scheme_name, scheme in schemes.items():
+        print("File round trip, scheme: {}".format(scheme_name))
+        sss = scheme()
+        sss.encrypt(test_input, cipherfile, keysfile, 5, 3)
+        keys = sharefile.read_keys(keysfile)
+        sss.decrypt_with_keys(cipherfile, outfile, random.sample(keys, 3))
+        with open(outfile, 'rb') as f:
+            assert f.read() == plaintext
+        sss.decrypt_with_keys(cipherfile, outfile, keys[:2])
+        with open(outfile, 'rb') as f:
+            assert f.read() != plaintext
+
+def test_backends(tmp):
+    '''
+    Check that the parallel AES-CTR engine and every I/O backend are byte-identical to the serial stream
+    '''
+    cipherfile = os.path.join(tmp, "cipher.png")
+    key = Random.new().read(32)
+    crypt_file(key, test_input, cipherfile)
+    with open(cipherfile, 'rb') as f:
+        expected = f.read()
+    for backend in BACKENDS:
+        for blocksize in [16, 4096, BLOCKSIZE]:
+            print("Parallel AES-CTR, backend: {}, blocksize: {}".format(backend, blocksize))
+            crypt_file(key, test_input, cipherfile, blocksize, workers = 4, backend = backend)
+            with open(cipherfile, 'rb') as f:
+                assert f.read() == expected
+
+def test_tree(tmp, plaintext):
+    '''
+    Check that directory mode restores every file of a nested tree, including empty files, from a quorum of per-custodian manifests
+    '''
+    indir, outdir, restored, manifest = [os.path.join(tmp, name) for name in ["tree", "tree_encrypted", "tree_restored", "manifest"]]
+    files = {"lenna.png": plaintext, "empty": b"", os.path.join("a", "b", "small.bin"): Random.new().read(1000)}
+    for path, data in files.items():
+        os.makedirs(os.path.dirname(os.path.join(indir, path)), exist_ok = True)
+        with open(os.path.join(indir, path), 'wb') as f:
+            f.write(data)
+
+    for scheme_name, scheme in schemes.items():
+        print("Directory mode, scheme: {}".format(scheme_name))
+        sss = scheme()
+        manifests = sss.encrypt_tree(indir, outdir, manifest, 5, 3, workers = 2, blocksize = 4096)
+        for i, name in enumerate(manifests):
+            with open(name, 'r') as f:
+                content = json.load(f)
+            assert content['share'] == i + 1 and sorted(content['files']) == sorted(files)
+        sss.decrypt_tree(outdir, restored, [manifests[4], manifests[1], manifests[2]], workers = 2, blocksize = 4096)
+        for path, data in files.items():
+            with open(os.path.join(restored, path), 'rb') as f:
+                assert f.read() == data
+
+        error = None
+        try:
+            sss.decrypt_tree(outdir, restored, manifests[:2], workers = 2, blocksize = 4096)
+        except Exception as e:
+            error = e
+        assert error is not None and "Insufficient manifests" in error.args[0]
+        shutil.rmtree(outdir)
+        shutil.rmtree(restored)
+
+def test_payload(tmp, plaintext):
+    '''
+    Check that GF256 payload shares restore the file if and only if at least k share files are given
+    '''
+    sharefiles, outfile = os.path.join(tmp, "shares"), os.path.join(tmp, "lenna_restored.png")
+    sss = GF256SSS()
+    sss.split_file(test_input, sharefiles, 5, 3, blocksize = 4096)
+    for subset in all_subsets(["{}.{}".format(sharefiles, x) for x in range(1, 6)]):
+        print("GF256 payload, share files: {}".format([os.path.basename(s) for s in subset]))
+        sss.combine_files(subset, outfile)
+        with open(outfile, 'rb') as f:
+            assert (f.read() == plaintext) == (len(subset) >= 3)
+
+def test_dispersal(tmp, plaintext):
+    '''
+    Check that dispersed ciphertext is rebuilt from any k fragments, and that corrupt fragments are discarded
+    '''
+    cipherfile, keysfile, outfile = [os.path.join(tmp, name) for name in ["cipher.png", "keys.txt", "lenna_restored.png"]]
+    sss = ShamirSSS()
+    sss.encrypt_dispersed(test_input, cipherfile, keysfile, 5, 3, blocksize = 4096)
+    fragfiles = ["{}.{}".format(cipherfile, x) for x in range(1, 6)]
+    for subset in combinations(fragfiles, 3):
+        print("Dispersal, fragment files: {}".format([os.path.basename(s) for s in subset]))
+        assert sss.decrypt_dispersed(list(subset), outfile, keysfile) == []
+        with open(outfile, 'rb') as f:
+            assert f.read() == plaintext
+    with open(fragfiles[0], 'r+b') as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 1]))
+    assert sss.decrypt_dispersed(fragfiles, outfile, keysfile) == [fragfiles[0]]
+    with open(outfile, 'rb') as f:
+        assert f.read() == plaintext
+
+def test_keysfiles(tmp):
+    '''
+    Check that keys survive conversion between the text and the binary format, and that shares can be looked up by id
+    '''
+    keysfile = os.path.join(tmp, "keys.bin")
+    for scheme_name, scheme in schemes.items():
+        print("Binary keys file, scheme: {}".format(scheme_name))
+        sss = scheme()
+        keys = sss.split_key(Random.new().read(32), 7, 4)
+        sss.store_keys(keysfile, keys, 7, 4, binary = True)
+        header, binary_keys, ids = sharefile.read_shares(keysfile)
+        assert binary_keys == keys and ids == list(range(1, 8))
+        assert header == {'scheme': scheme_name, 'n': 7, 'k': 4, 'count': 7, 'elements': len(keys[0])}
+        assert all(sharefile.read_share(keysfile, i) == keys[i-1] for i in ids)
+
+    # Gathered subsets keep their ids, and every share is found through its slot
+    sharefile.write_shares(keysfile, keys[:3], scheme_name, 7, 4, ids = [6, 2, 4])
+    assert sharefile.read_shares(keysfile)[2] == [2, 4, 6]
+    assert [sharefile.read_share(keysfile, i) for i in [2, 4, 6]] == [keys[1], keys[2], keys[0]]
+    for i in [1, 3, 7]:
+        try:
+            sharefile.read_share(keysfile, i)
+            assert False, "Key {} was found in a file without it".format(i)
+        except Exception as e:
+            assert "is not in" in str(e)
+
+    # Version 1 files hold a sorted index of ids in place of the table
+    with open(keysfile, 'wb') as f:
+        f.write(sharefile.HEADER.pack(sharefile.MAGIC, 1, 2, 7, 3, 2, 2) + struct.pack('<2H2I', 1, 2, 3, 5))
+        f.write(bytes([3, 1, 0, 5, 2, 0]))
+    assert sharefile.read_shares(keysfile)[1:] == ([[3, 1], [5, 2]], [3, 5])
+    assert sharefile.read_share(keysfile, 5) == [5, 2]
+
+def test_bulk():
+    '''
+    Check that the bulk API agrees with split_key/combine_keys
+    '''
+    for scheme_name, scheme in schemes.items():
+        print("Bulk split/combine, scheme: {}".format(scheme_name))
+        sss = scheme()
+        secrets = [Random.new().read(32) for _ in range(50)]
+        shares = sss.split_keys(secrets, 7, 4)
+        assert all(len(keys) == 7 for keys in shares)
+        assert sss.combine_keys_batch([keys[:4] for keys in shares]) == secrets
+        assert sss.combine_keys_batch([keys[3:] for keys in shares]) == [sss.combine_keys(keys[3:]) for keys in shares]
+
+        # Mixed quorums in arbitrary order, batched per quorum
+        quorums = [random.sample(keys, 4) for keys in shares]
+        assert sss.combine_keys_batch(quorums) == secrets
+        assert sss.combine_keys_batch(shares) == secrets
+
+def test_correction():
+    '''
+    Check that corrupt Shamir shares are located and discarded, up to (t-k)/2 of t shares
+    '''
+    sss = ShamirSSS()
+    for n, k in [(7, 3), (10, 4), (40, 15)]:
+        print("Shamir error correction, n: {}, k: {}".format(n, k))
+        secret = Random.new().read(32)
+        keys = sss.split_key(secret, n, k)
+        for e in range((n - k) // 2 + 1):
+            corrupt = [[x, (y + 1) % sss.p] for x, y in keys[:e]] + keys[e:]
+            good, bad = sss.correct_keys(corrupt, k)
+            assert bad == corrupt[:e] and sss.combine_keys(good) == secret
+
+def test_verifiable():
+    '''
+    Check that verifiable shares pass their commitments, alone and in batches, and that tampered shares are rejected
+    '''
+    sss = ShamirSSS()
+    for n, k in [(5, 3), (100, 10)]:
+        print("Shamir verifiable shares, n: {}, k: {}".format(n, k))
+        secret = Random.new().read(32)
+        keys, commitments = sss.split_key_verifiable(secret, n, k)
+        assert sss.combine_keys(keys[-k:]) == secret
+        assert all(sss.verify_key(key, commitments) for key in keys)
+        assert sss.verify_keys(keys, commitments) == []
+        tampered = [[x, y + 1] for x, y in keys[:2]] + keys[2:]
+        assert not sss.verify_key(tampered[0], commitments)
+        assert sss.verify_keys(tampered, commitments) == tampered[:2]
+
+def test_aead(tmp, plaintext):
+    '''
+    Check that authenticated containers restore the file with k keys, reject fewer keys before decrypting, and detect tampering
+    '''
+    cipherfile, keysfile, outfile = [os.path.join(tmp, name) for name in ["cipher.png", "keys.txt", "lenna_restored.png"]]
+    for scheme_name, scheme in schemes.items():
+        print("Authenticated container, scheme: {}".format(scheme_name))
+        sss = scheme()
+        sss.encrypt(test_input, cipherfile, keysfile, 5, 3, 4096, aead = True)
+        keys = sharefile.read_keys(keysfile)
+        sss.decrypt_with_keys(cipherfile, outfile, keys[2:])
+        with open(outfile, 'rb') as f:
+            assert f.read() == plaintext
+        os.remove(outfile)
+        error = None
+        try:
+            sss.decrypt_with_keys(cipherfile, outfile, keys[:2])
+        except Exception as e:
+            error = e
+        assert error is not None and error.args[0].startswith(("Keys provided", "Insufficient")) and not os.path.exists(outfile)
+
+    with open(cipherfile, 'r+b') as f:
+        f.seek(5000)
+        byte = f.read(1)
+        f.seek(5000)
+        f.write(bytes([byte[0] ^ 1]))
+    try:
+        sss.decrypt_with_keys(cipherfile, outfile, keys)
+        assert False
+    except Exception as e:
+        assert "failed verification" in e.args[0] and not os.path.exists(outfile)
+
+    for blocksize in [0, -1, 2 ** 32]:
+        error = None
+        try:
+            sss.encrypt(test_input, cipherfile, keysfile, 5, 3, blocksize, aead = True)
+        except Exception as e:
+            error = e
+        assert error is not None and "Block size" in error.args[0]
+
+def test_reshare():
+    '''
+    Check that added and refreshed keys combine to the same secret, and that refreshed keys do not mix with old ones
+    '''
+    for scheme_name, scheme in schemes.items():
+        print("Add/refresh keys, scheme: {}".format(scheme_name))
+        sss = scheme()
+        secret = Random.new().read(32)
+        keys = sss.split_key(secret, 7, 5)
+        added = sss.add_keys(keys[2:], 5, range(1, 10))
+        assert added[:7] == keys and sss.combine_keys(added[4:]) == secret
+        refreshed = sss.refresh_keys(added, 5)
+        assert sss.combine_keys(refreshed[:5]) == secret and refreshed != added
+
+        # Combining may also fail outright, which is fine: it just must not yield the secret
+        try:
+            mixed = sss.combine_keys(refreshed[:4] + added[4:5])
+        except Exception:
+            mixed = None
+        assert mixed != secret, "{} combined refreshed keys with an old key".format(scheme_name)
+
+        for ids in [[0], [-1], [256] if scheme_name == 'GF256' else [sss.p] if scheme_name == 'Shamir' else [0, 1]]:
+            error = None
+            try:
+                sss.add_keys(keys, 5, ids)
+            except Exception as e:
+                error = e
+            assert error is not None and "Key ids" in error.args[0], "{} accepted key ids {}".format(scheme_name, ids)
+
+    # Keys mod smaller primes than AsmuthBloomSSS uses must not be converted: y would then be recovered from k-1 converted keys
+    small = AsmuthBloomSSS()
+    small.moduli_bits = 258
+    m = small.find_moduli([], 6)
+    y = random_ints(1)[0] + random_ints(1, 64)[0] % (prod(m[:4]) // small.m0 - 1) * small.m0
+    keys = [[mi, y % mi] for mi in m]
+    for function in [lambda: AsmuthBloomSSS().add_keys(keys, 4, range(1, 7)), lambda: AsmuthBloomSSS().refresh_keys(keys, 4)]:
+        error = None
+        try:
+            function()
+        except Exception as e:
+            error = e
+        assert error is not None and "unsupported moduli" in error.args[0]
+
+def test_profiler(tmp, plaintext):
+    '''
+    Check that an enabled profiler records every stage of encrypt/decrypt with its bytes and key counts, and a disabled one nothing
+    '''
+    print("Profiler")
+    cipherfile, keysfile, outfile = [os.path.join(tmp, name) for name in ["cipher.png", "keys.txt", "lenna_restored.png"]]
+    sss = ShamirSSS()
+    sss.encrypt(test_input, cipherfile, keysfile, 5, 3)
+    assert sss.profiler.stages == {}
+
+    sss.profiler = Profiler()
+    sss.encrypt(test_input, cipherfile, keysfile, 5, 3)
+    sss.decrypt(cipherfile, outfile, keysfile)
+    stages = sss.profiler.stages
+    assert list(stages) == ['keygen', 'read', 'aes', 'write', 'split', 'store', 'load', 'combine']
+    assert all(stages[name]['calls'] == 2 and stages[name]['bytes'] == 2 * len(plaintext) for name in ['read', 'aes', 'write'])
+    assert stages['split']['items'] == 5 and stages['combine']['items'] == 5
+    assert sss.profiler.caches['Shamir']['misses'] == 1
+    assert 'sss_stage_seconds_total{stage="aes"}' in sss.profiler.to_prometheus()
+
+def test_async(tmp, plaintext):
+    '''
+    Check that concurrent AsyncSSS encrypt/decrypt calls sharing one scheme instance all round-trip,
+    that cancelling an operation removes its partial outfile, and that scheme caches can be shared between threads
+    '''
+    print("AsyncSSS")
+
+    async def roundtrip(asss, i):
+        cipherfile, keysfile, outfile = [os.path.join(tmp, name.format(i)) for name in ["async{}.enc", "async{}.txt", "async{}.png"]]
+        await asss.encrypt(test_input, cipherfile, keysfile, 6, 3)
+        await asss.decrypt(cipherfile, outfile, keysfile)
+        with open(outfile, 'rb') as f:
+            return f.read()
+
+    async def roundtrip_sealed(asss, cipherfile, keysfile, outfile):
+        await asss.decrypt(cipherfile, outfile, keysfile)
+        with open(outfile, 'rb') as f:
+            return f.read()
+
+    async def cancel(operation, outfile):
+        task = asyncio.ensure_future(operation)
+        while not os.path.exists(outfile):
+            await asyncio.sleep(0.001)
+        task.cancel()
+        try:
+            await task
+            assert False, "Cancelled encrypt finished"
+        except asyncio.CancelledError:
+            pass
+        assert not os.path.exists(outfile)
+
+    for scheme_name, scheme in schemes.items():
+        # Small blocks and cache sizes, so operations interleave and caches evict while shared
+        sss = scheme(cache_size = 2) if scheme_name != 'GF256' else scheme()
+        asss = AsyncSSS(sss, max_concurrency = 8, blocksize = 4096)
+
+        async def run():
+            return await asyncio.gather(*[roundtrip(asss, i) for i in range(8)])
+        assert all(result == plaintext for result in asyncio.run(run())), "{} failed concurrent round trips".format(scheme_name)
+    asss = AsyncSSS(ShamirSSS(), blocksize = 1024)
+    cipherfile, keysfile = os.path.join(tmp, "cancelled.enc"), os.path.join(tmp, "cancelled.txt")
+    asyncio.run(cancel(asss.encrypt(test_input, cipherfile, keysfile, 5, 3), cipherfile))
+
+    # Authenticated containers are decrypted chunk by chunk too, so cancelling also stops at a chunk boundary
+    asss.sss.encrypt(test_input, cipherfile, keysfile, 5, 3, 1024, aead = True)
+    outfile = os.path.join(tmp, "cancelled.png")
+    asyncio.run(cancel(asss.decrypt(cipherfile, outfile, keysfile), outfile))
+    assert asyncio.run(roundtrip_sealed(asss, cipherfile, keysfile, outfile)) == plaintext
+
+    sss = ShamirSSS(cache_size = 2)
+    key = Random.new().read(32)
+    keys = sss.split_key(key, 8, 3)
+    quorums = [list(quorum) for quorum in combinations(keys, 3)]
+
+    # Switch threads as often as possible, so that lookups and evictions of the same cache interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            assert all(result == key for result in executor.map(sss.combine_keys, quorums[:3] * 500))
+    finally:
+        sys.setswitchinterval(interval)
+
+def test_moduli():
+    '''
+    Check that AsmuthBloomSSS moduli found by concurrent threads are distinct, in increasing order and shared consistently
+    '''
+    print("Moduli")
+    AsmuthBloomSSS.moduli = []
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda n: AsmuthBloomSSS().get_moduli(n), [60, 20, 80, 40, 60, 30, 80, 10]))
+    m = AsmuthBloomSSS.moduli
+    assert len(m) == 80 and len(set(m)) == 80 and m == sorted(m)
+    assert all(r == m[:len(r)] for r in results)
+
+def test_dealers():
+    '''
+    Check that dealers are reused per (n, k), that their keys combine for every scheme, and that the dealer cache stays within its byte bound
+    '''
+    print("Dealers")
+    key = Random.new().read(32)
+    for scheme_name, scheme in schemes.items():
+        sss = scheme()
+        for n, k in [(5, 3), (7, 4), (5, 3)]:
+            keys = sss.dealer(n, k).split([key])[0]
+            assert sss.combine_keys(keys[:k]) == key and sss.combine_keys(keys[-k:]) == key, "{} failed with n = {}, k = {}".format(scheme_name, n, k)
+        assert sss.dealers.info()['hits'] == 1 and sss.dealers.info()['misses'] == 2
+
+    m = AsmuthBloomSSS().get_moduli(9)
+    y = prod(m) - 12345
+    assert remainders(product_tree(m), y) == [y % mi for mi in m]
+    ys = [y, 0, prod(m) // 2]
+    columns = remainders_columns(product_tree(m), ys)
+    assert columns == [[v % mi for v in ys] for mi in m]
+    assert crt_columns(crt_tree(m), columns) == ys
+
+    cache = LRUCache(maxsize = 10, maxbytes = 100, weight = len)
+    for name in ['a' * 40, 'b' * 40, 'c' * 40, 'd' * 200]:
+        cache.lookup(name, lambda: name)
+    assert list(cache.data) == ['b' * 40, 'c' * 40] and cache.nbytes == 80
+
+if __name__ == '__main__':
+    '''
+    Sample execution:
+
+    >>> python3 test.py
+    >>> python3 test.py -workers 8 -samples 20000
+    '''
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-workers", help = "Number of processes checking configurations in parallel (default: one per core)", type = int)
+    parser.add_argument("-samples", help = "Number of subsets of keys checked for configurations with n > {} (default: 500)".format(EXHAUSTIVE), type = int, default = 500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(test_input, 'rb') as f:
+        plaintext = f.read()
+
+    # All files are written to a temporary directory, which is removed afterwards
+    tmp = tempfile.mkdtemp()
+    try:
+        test_subsets(args.workers, args.samples)
+        test_files(tmp, plaintext)
+        test_backends(tmp)
+        test_tree(tmp, plaintext)
+        test_payload(tmp, plaintext)
+        test_dispersal(tmp, plaintext)
+        test_keysfiles(tmp)
+        test_bulk()
+        test_correction()
+        test_verifiable()
+        test_aead(tmp, plaintext)
+        test_reshare()
+        test_profiler(tmp, plaintext)
+        test_dealers()
+        test_moduli()
+        test_async(tmp, plaintext)
+    finally:
+        shutil.rmtree(tmp)
+
+    print("All testing done! ({:.1f} s)".format(time.perf_counter() - start))
@@ -0,0 +1,135 @@
+import json, os, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Crypto import Random
+from sss import BLOCKSIZE, crypt_file
+
+# Directory mode: encrypt/decrypt every file of a tree with its own AES-256 key, fanning files out to a pool of processes
+#
+# Conventions:
+# Paths are relative to the tree's root, with '/' as separator
+# Key/share i of every file is stored in manifest i = manifest.1, manifest.2, ... , manifest.n, one per custodian:
+# a JSON file {"scheme": name, "n": n, "k": k, "share": i, "files": {relative path: key/share i}}
+# so no single manifest reveals anything, and any k of them decrypt the whole tree
+#
+# Implementation notes:
+# This module is only imported in directory mode, so the process pool (which pulls in multiprocessing) does not slow down start-up otherwise
+
+def encrypt_tree(sss, indir, outdir, manifest, n, k, workers = None, blocksize = BLOCKSIZE, progress = None):
+    '''
+    Encrypts every file below indir with the scheme sss to the same relative path below outdir, fanning files out to a pool of workers processes
+    Every file gets its own AES-256 key. All keys are split with one split_keys call, and key/share i of every file is
+    collected in manifest i = manifest.1, manifest.2, ... , manifest.n, one per custodian (see Conventions above)
+    If given, progress(files done, total files, bytes done, seconds elapsed) is called after every file
+
+    Returns the names of the n manifests
+    '''
+
+    profiler = sss.profiler
+    paths = list_tree(indir)
+    sizes = [os.path.getsize(os.path.join(indir, path)) for path in paths]
+
+    # Encrypt all files in parallel. Each worker returns the key it generated
+    # Workers run in other processes, so the whole pool is recorded as a single stage
+    with profiler.stage('crypt', sum(sizes), len(paths)):
+        keys = run_pool(encrypt_file, [(os.path.join(indir, path), os.path.join(outdir, path), blocksize) for path in paths],
+                        sizes, workers, progress)
+
+    # Generate n keys per file and store key i of every file in manifest i
+    with profiler.stage('split', items = n * len(keys)):
+        shares = sss.split_keys(keys, n, k)
+    manifests = ["{}.{}".format(manifest, i) for i in range(1, n+1)]
+    with profiler.stage('store', items = n * len(keys)):
+        for i, name in enumerate(manifests):
+            with open(name, 'w') as f:
+                json.dump({'scheme': sss.name, 'n': n, 'k': k, 'share': i + 1, 'files': {path: s[i] for path, s in zip(paths, shares)}}, f)
+    return manifests
+
+def decrypt_tree(sss, indir, outdir, manifests, workers = None, blocksize = BLOCKSIZE, progress = None):
+    '''
+    Decrypts every file listed in the manifests from indir to outdir with the scheme sss, fanning files out to a pool of workers processes
+    manifests is a list of >= k manifests written by encrypt_tree, e.g. one brought by each custodian of a quorum
+    Keys of all files are merged from the manifests and combined with one combine_keys_batch call first
+    If given, progress(files done, total files, bytes done, seconds elapsed) is called after every file
+    '''
+
+    profiler = sss.profiler
+
+    # Read keys/shares from every manifest and merge them per file
+    with profiler.stage('load') as stage:
+        files = merge_manifests(manifests)
+        paths = sorted(files)
+        stage.items = sum(len(files[path]) for path in paths)
+    with profiler.stage('combine', items = stage.items):
+        keys = sss.combine_keys_batch([files[path] for path in paths])
+    sss.record_caches()
+
+    # Decrypt all files in parallel
+    sizes = [os.path.getsize(os.path.join(indir, path)) for path in paths]
+    with profiler.stage('crypt', sum(sizes), len(paths)):
+        run_pool(crypt_file, [(key, os.path.join(indir, path), os.path.join(outdir, path), blocksize) for key, path in zip(keys, paths)],
+                 sizes, workers, progress)
+
+def encrypt_file(infile, outfile, blocksize = BLOCKSIZE):
+    '''
+    Encrypts infile to outfile via AES-256 with a fresh random key
+    Returns the key
+    '''
+    key = Random.new().read(32)
+    crypt_file(key, infile, outfile, blocksize)
+    return key
+
+def list_tree(directory):
+    '''
+    Returns the paths of all files below directory, relative to it, in sorted order and with '/' as separator
+    '''
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            paths.append(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/'))
+    return sorted(paths)
+
+def merge_manifests(manifests):
+    '''
+    Reads manifests written by encrypt_tree and merges their keys/shares per file
+    Throws exception if the manifests belong to different trees, repeat a share, or fewer than k are given
+
+    Returns {relative path: keys/shares of that file}
+    '''
+    contents = []
+    for manifest in manifests:
+        with open(manifest, 'r') as f:
+            contents.append(json.load(f))
+
+    first = contents[0]
+    if any((c['scheme'], c['k'], sorted(c['files'])) != (first['scheme'], first['k'], sorted(first['files'])) for c in contents):
+        raise Exception("Manifests of different trees were provided. Please ensure all manifests were written by the same encryption.")
+    if len(set(c['share'] for c in contents)) != len(contents):
+        raise Exception("Manifests with the same share were provided. Please ensure all manifests are distinct.")
+    if len(contents) < first['k']:
+        raise Exception("Insufficient manifests provided. Please ensure at least {} manifests are provided.".format(first['k']))
+
+    return {path: [c['files'][path] for c in contents] for path in first['files']}
+
+def run_pool(function, jobs, sizes, workers = None, progress = None):
+    '''
+    Runs function(*job) for every job in a pool of workers processes (default: one per core)
+    Output directories are created up front, as the second last argument of each job is its output file
+    If given, progress(jobs done, total jobs, bytes done, seconds elapsed) is called as jobs finish, sizes[i] being the bytes of job i
+
+    Returns the results in the order of jobs
+    '''
+    for job in jobs:
+        os.makedirs(os.path.dirname(job[-2]) or '.', exist_ok = True)
+
+    start = time.perf_counter()
+    results = [None] * len(jobs)
+    done, nbytes = 0, 0
+    with ProcessPoolExecutor(max_workers = workers) as pool:
+        futures = {pool.submit(function, *job): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            done, nbytes = done + 1, nbytes + sizes[i]
+            if progress is not None:
+                progress(done, len(jobs), nbytes, time.perf_counter() - start)
+    return results